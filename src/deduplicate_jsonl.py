@@ -1,14 +1,370 @@
 #!/usr/bin/env python3
 
 
+# Heavier modules (argparse, orjson, gzip, multiprocessing, ...) are imported
+# where they are used, since this tool is often run once per file in shell loops
 import os
+import re
 import json
-import argparse
+import mmap
 import sys
 from collections import Counter
+from contextlib import contextmanager
 
+_BUFFER_SIZE = 1 << 20
+# Only the first few malformed lines are printed so a corrupt file cannot flood stdout
+_MAX_INVALID_WARNINGS = 20
+_COMPRESSED_SUFFIXES = (".gz", ".zst")
+_json_loads = None
 
-def deduplicate_jsonl_file(input_file, output_file=None, key_field='url', verbose=True):
+
+def _get_json_loads():
+    """Pick the JSON parser on first use: orjson if installed, else the stdlib"""
+    global _json_loads
+    if _json_loads is None:
+        import platform
+        if platform.python_implementation() == "PyPy":
+            # The streaming path is plain stdlib code, which PyPy's JIT traces well;
+            # orjson is a CPython-only extension
+            _json_loads = json.loads
+        else:
+            try:
+                import orjson
+                _json_loads = orjson.loads
+            except ImportError:  # orjson is optional, fall back to the stdlib parser
+                _json_loads = json.loads
+    return _json_loads
+
+
+def _make_key_extractor(key_field):
+    """
+    Build a function that returns the dedup key of a raw JSONL line
+    
+    When the field appears once with a plain string value, it is read straight
+    from the bytes: first by searching for the exact `"field": "` / `"field":"`
+    layouts that json.dumps and compact writers produce, then with a
+    precompiled regex that tolerates other whitespace. The shortcut is only
+    taken for complete one-object lines where no nested object opens before
+    the field, so it cannot pick up a nested field or accept a truncated line.
+    Everything else (escaped or non-string values, repeated field names,
+    nesting) falls back to a full JSON parse, which raises on invalid lines and
+    only reads top-level fields. String keys are returned as UTF-8 bytes on
+    every path.
+    """
+    field = b'"' + key_field.encode("utf-8") + b'"'
+    needles = [(needle, len(needle)) for needle in (field + b': "', field + b':"')]
+    key_re = re.compile(re.escape(field) + rb'\s*:\s*"([^"\\]*)"')
+    json_loads = _get_json_loads()
+    
+    def extract_key(line):
+        if (line.count(field) == 1 and line.startswith(b"{")
+                and line.endswith((b"}\n", b"}", b"}\r\n"))):
+            for needle, needle_len in needles:
+                start = line.find(needle)
+                if start != -1:
+                    if line.find(b"{", 1, start) != -1:
+                        break
+                    start += needle_len
+                    end = line.find(b'"', start)
+                    if end != -1 and line.find(b"\\", start, end) == -1:
+                        return line[start:end]
+                    break
+            else:
+                match = key_re.search(line)
+                if match and line.find(b"{", 1, match.start()) == -1:
+                    return match.group(1)
+        record = json_loads(line)
+        if not isinstance(record, dict):
+            return None
+        key = record.get(key_field)
+        return key.encode("utf-8") if isinstance(key, str) else key
+    
+    return extract_key
+
+
+def _open_binary(path, mode):
+    """
+    Open a file for binary reading ("rb") or writing ("wb"), transparently
+    (de)compressing .gz and .zst files
+    
+    Compression uses the fastest level, since the point is to cut disk I/O on
+    large outputs rather than to minimize size.
+    """
+    if path.endswith(".gz"):
+        import gzip
+        return gzip.open(path, mode, compresslevel=1)
+    if path.endswith(".zst"):
+        import io
+        import zstandard  # Optional dependency, only needed for .zst files
+        raw = open(path, mode, buffering=_BUFFER_SIZE)
+        if mode == "rb":
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw), _BUFFER_SIZE)
+        return zstandard.ZstdCompressor(level=1, threads=-1).stream_writer(raw)
+    return open(path, mode, buffering=_BUFFER_SIZE)
+
+
+@contextmanager
+def _staged_output(input_file, output_file):
+    """
+    Yield the path the output should be written to
+    
+    Opening the output for writing truncates it, so when it is the input file
+    itself (or a link to it) the result is written to a temporary file in the
+    same directory and moved over the input only once it is complete.
+    """
+    try:
+        same_file = os.path.samefile(input_file, output_file)
+    except OSError:  # The output does not exist yet
+        same_file = False
+    if not same_file:
+        yield output_file
+        return
+    import shutil
+    import tempfile
+    # Replace the real file rather than a symlink pointing at it
+    target = os.path.realpath(output_file)
+    directory, name = os.path.split(target)
+    # Keep the extension so the temporary file gets the same compression
+    fd, temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=os.path.splitext(name)[1], dir=directory)
+    os.close(fd)
+    try:
+        shutil.copymode(target, temp_path)
+        yield temp_path
+        os.replace(temp_path, target)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def _iter_lines(fin):
+    """
+    Yield raw lines from a binary file, reading through mmap when possible
+    
+    Mapping the file lets newline scanning run in C over the page cache
+    without copying through a read buffer first.
+    """
+    try:
+        mm = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):
+        # Empty files, pipes and other streams cannot be mapped
+        yield from fin
+        return
+    with mm:
+        yield from iter(mm.readline, b"")
+
+
+def _dedup_streaming(input_file, output_file, key_field, verbose, exact, key_counts):
+    """
+    Deduplicate in a single streaming pass, keeping the first record for each key
+    
+    Returns:
+        tuple: (Number of input records, Number of output records)
+    """
+    extract_key = _make_key_extractor(key_field)
+    seen = set()
+    num_input = 0
+    num_invalid = 0
+    # Compressed input has to be decompressed as a stream rather than mapped
+    mappable = not input_file.endswith(_COMPRESSED_SUFFIXES)
+    with _staged_output(input_file, output_file) as output_path, \
+            _open_binary(input_file, "rb") as fin, _open_binary(output_path, "wb") as fout:
+        # Bind hot-loop lookups to locals once instead of per line
+        seen_add = seen.add
+        write = fout.write
+        last_written = None
+        for line_num, line in enumerate(_iter_lines(fin) if mappable else fin, 1):
+            if not line.strip():  # Skip empty lines
+                continue
+            try:
+                # Only the key is extracted; the record itself is not kept
+                key = extract_key(line)
+            except json.JSONDecodeError as e:
+                num_invalid += 1
+                if verbose and num_invalid <= _MAX_INVALID_WARNINGS:
+                    print(f"Warning: Invalid JSON on line {line_num}: {e}")
+                    print(f"Line content: {line[:70].strip().decode('utf-8', 'replace')}...")
+                continue
+            num_input += 1
+            
+            if not key:
+                continue
+            if key_counts is not None:
+                key_counts[key] += 1
+            if not exact:
+                key = hash(key)
+            if key not in seen:
+                seen_add(key)
+                # Write the original line byte-for-byte instead of re-serializing the record
+                write(line)
+                last_written = line
+        # Only the last line of the input can lack its newline
+        if last_written and not last_written.endswith(b"\n"):
+            write(b"\n")
+    
+    if verbose and num_invalid > _MAX_INVALID_WARNINGS:
+        print(f"... and {num_invalid - _MAX_INVALID_WARNINGS} more invalid lines")
+    
+    # Every kept record added exactly one key to the seen set
+    return num_input, len(seen)
+
+
+def _shard_bounds(input_file, jobs):
+    """Split a file into up to `jobs` contiguous byte ranges that start on line boundaries"""
+    size = os.path.getsize(input_file)
+    bounds = [0]
+    with open(input_file, "rb") as f:
+        for i in range(1, jobs):
+            f.seek(size * i // jobs)
+            f.readline()  # Snap forward to the start of the next line
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _scan_shard(task):
+    """
+    Worker for the parallel path: extract keys for one byte range of the input
+    
+    Unless exact is set, keys are returned as 64-bit BLAKE2b digests so the
+    parent holds 8-byte ints rather than every raw key. The builtin hash() is
+    salted per process, so it cannot be compared across workers.
+    
+    Returns:
+        tuple: (First (key, start, end) per key within the shard, number of records,
+                number of invalid lines, the first few of them as (offset, error, preview),
+                key Counter or None)
+    """
+    input_file, start, end, key_field, exact, count_keys = task
+    from hashlib import blake2b
+    
+    extract_key = _make_key_extractor(key_field)
+    seen = set()
+    kept = []
+    invalid = []
+    key_counts = Counter() if count_keys else None
+    num_input = 0
+    num_invalid = 0
+    with open(input_file, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            newline = mm.find(b"\n", pos, end)
+            line_end = end if newline == -1 else newline + 1
+            line = mm[pos:line_end]
+            line_start, pos = pos, line_end
+            if not line.strip():
+                continue
+            try:
+                key = extract_key(line)
+            except json.JSONDecodeError as e:
+                num_invalid += 1
+                if num_invalid <= _MAX_INVALID_WARNINGS:
+                    invalid.append((line_start, str(e), line[:70].strip().decode("utf-8", "replace")))
+                continue
+            num_input += 1
+            if not key:
+                continue
+            if key_counts is not None:
+                key_counts[key] += 1
+            if not exact:
+                # Non-string keys are digested by repr, behind a prefix no UTF-8 string key has
+                raw = key if isinstance(key, bytes) else b"\xff" + repr(key).encode("utf-8")
+                key = int.from_bytes(blake2b(raw, digest_size=8).digest(), "big")
+            if key not in seen:
+                seen.add(key)
+                kept.append((key, line_start, line_end))
+    return kept, num_input, num_invalid, invalid, key_counts
+
+
+def _copy_range(in_fd, out_fd, start, end):
+    """Copy bytes [start, end) of in_fd to out_fd, inside the kernel when possible"""
+    while start < end:
+        count = end - start
+        try:
+            copied = os.copy_file_range(in_fd, out_fd, count, start)
+        except (AttributeError, OSError):
+            try:
+                # Older kernels and non-Linux platforms
+                copied = os.sendfile(out_fd, in_fd, start, count)
+            except (AttributeError, OSError):
+                copied = 0
+        if not copied:
+            data = os.pread(in_fd, count, start)
+            if not data:
+                # The input shrank after it was scanned
+                raise OSError(f"Input ended at byte {start}, expected {end}")
+            copied = os.write(out_fd, data)
+        start += copied
+
+
+def _copy_ranges(in_fd, out_fd, ranges):
+    """
+    Copy the kept line ranges of the input to the output without reading them into Python
+    
+    Adjacent ranges are coalesced so runs of unique lines become a single copy.
+    """
+    merged = []
+    for start, end in ranges:
+        if merged and merged[-1][1] == start:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    for start, end in merged:
+        _copy_range(in_fd, out_fd, start, end)
+    # Only the last line of the input can lack its newline
+    if merged and os.pread(in_fd, 1, merged[-1][1] - 1) != b"\n":
+        os.write(out_fd, b"\n")
+
+
+def _dedup_parallel(input_file, output_file, key_field, verbose, exact, key_counts, jobs):
+    """
+    Deduplicate by scanning newline-aligned shards in worker processes
+    
+    Workers drop duplicates within their shard; the parent then merges shards in
+    file order against a global seen set, so the first record for each key wins
+    exactly as in the streaming path.
+    
+    Returns:
+        tuple: (Number of input records, Number of output records)
+    """
+    import multiprocessing
+    
+    tasks = [(input_file, start, end, key_field, exact, key_counts is not None)
+             for start, end in _shard_bounds(input_file, jobs)]
+    with multiprocessing.Pool(min(jobs, len(tasks))) as pool:
+        results = pool.map(_scan_shard, tasks)
+    
+    seen = set()
+    ranges = []
+    num_input = 0
+    num_invalid = 0
+    for kept, shard_input, shard_invalid, invalid, shard_counts in results:
+        num_input += shard_input
+        if verbose:
+            for offset, error, preview in invalid[:max(0, _MAX_INVALID_WARNINGS - num_invalid)]:
+                print(f"Warning: Invalid JSON at byte offset {offset}: {error}")
+                print(f"Line content: {preview}...")
+        num_invalid += shard_invalid
+        if shard_counts is not None:
+            key_counts.update(shard_counts)
+        for key, start, end in kept:
+            if key not in seen:
+                seen.add(key)
+                ranges.append((start, end))
+    
+    if verbose and num_invalid > _MAX_INVALID_WARNINGS:
+        print(f"... and {num_invalid - _MAX_INVALID_WARNINGS} more invalid lines")
+    
+    with _staged_output(input_file, output_file) as output_path, \
+            open(input_file, "rb") as fin, open(output_path, "wb", buffering=0) as fout:
+        _copy_ranges(fin.fileno(), fout.fileno(), ranges)
+    
+    return num_input, len(ranges)
+
+
+def deduplicate_jsonl_file(input_file, output_file=None, key_field='url', verbose=True, exact=False, stats=False, jobs=1):
     """
     Deduplicate a JSONL file based on specified key field
     
@@ -17,6 +373,12 @@ def deduplicate_jsonl_file(input_file, output_file=None, key_field='url', verbos
         output_file: Path to the output JSONL file (if None, will use input_file + ".deduplicated.jsonl")
         key_field: Field to use for deduplication (default: 'url')
         verbose: Whether to print progress information
+        exact: Store the raw keys instead of their 64-bit hashes. Hashing keeps
+            memory small for long URLs; a collision (which would drop a unique
+            record) only becomes likely at around 2**32 distinct keys.
+        stats: Count every key and print the most duplicated ones at the end
+        jobs: Number of worker processes; values above 1 split the file into
+            shards that are scanned in parallel
         
     Returns:
         tuple: (Number of input records, Number of output records, Number of duplicates removed)
@@ -37,58 +399,34 @@ def deduplicate_jsonl_file(input_file, output_file=None, key_field='url', verbos
         print(f"Deduplicating based on '{key_field}' field...", flush=True)
     
     try:
-        # Read all records
-        records = []
-        with open(input_file, "r", encoding="utf-8") as f:
-            for line_num, line in enumerate(f, 1):
-                try:
-                    line = line.strip()
-                    if not line:  # Skip empty lines
-                        continue
-                    record = json.loads(line)
-                    records.append(record)
-                except json.JSONDecodeError as e:
-                    if verbose:
-                        print(f"Warning: Invalid JSON on line {line_num}: {e}")
-                        print(f"Line content: {line[:70]}...")
+        key_counts = Counter() if stats else None
+        # Sharding needs a regular, non-empty, uncompressed input that workers can
+        # mmap, and an uncompressed output that ranges can be copied into
+        if (jobs > 1 and os.path.isfile(input_file) and os.path.getsize(input_file) > 0
+                and not input_file.endswith(_COMPRESSED_SUFFIXES)
+                and not output_file.endswith(_COMPRESSED_SUFFIXES)):
+            num_input, num_output = _dedup_parallel(
+                input_file, output_file, key_field, verbose, exact, key_counts, jobs)
+        else:
+            num_input, num_output = _dedup_streaming(
+                input_file, output_file, key_field, verbose, exact, key_counts)
         
-        if verbose:
-            print(f"Read {len(records)} records from input file")
-        
-        # Count occurrences of each key value
-        key_values = [record.get(key_field) for record in records if record.get(key_field)]
-        key_counts = Counter(key_values)
-        
-        # Identify duplicates
-        duplicate_keys = [k for k, v in key_counts.items() if v > 1]
-        if verbose and duplicate_keys:
-            print(f"Found {len(duplicate_keys)} keys with duplicates")
-            # Print top duplicates for information
-            top_duplicates = sorted([(k, v) for k, v in key_counts.items() if v > 1], 
-                                   key=lambda x: x[1], reverse=True)[:5]        
-        # Deduplicate records
-        unique_records = {}
-        for record in records:
-            key = record.get(key_field)
-            if key and key not in unique_records:
-                unique_records[key] = record
-        
-        # Write unique records to output file
-        with open(output_file, "w", encoding="utf-8") as f:
-            for i, record in enumerate(unique_records.values()):
-                if i > 0:
-                    f.write("\n")
-                json.dump(record, f, ensure_ascii=False)
-        
-        num_input = len(records)
-        num_output = len(unique_records)
         num_duplicates = num_input - num_output
         
         if verbose:
+            print(f"Read {num_input} records from input file")
             print(f"\nDeduplication complete:")
             print(f"  Input records:     {num_input}")
             print(f"  Output records:    {num_output}")
             print(f"  Duplicates removed: {num_duplicates}")
+        
+        if stats:
+            duplicate_keys = [(k, v) for k, v in key_counts.most_common() if v > 1]
+            print(f"Found {len(duplicate_keys)} keys with duplicates")
+            for key, count in duplicate_keys[:5]:
+                if isinstance(key, bytes):
+                    key = key.decode("utf-8", "replace")
+                print(f"  {count}x {key}")
             
         return num_input, num_output, num_duplicates
         
@@ -99,11 +437,16 @@ def deduplicate_jsonl_file(input_file, output_file=None, key_field='url', verbos
 
 
 def main():
+    import argparse
+    
     parser = argparse.ArgumentParser(description="Deduplicate JSONL files based on a specified field")
     parser.add_argument("input_file", help="Input JSONL file to deduplicate")
     parser.add_argument("-o", "--output", help="Output file path (default: input_file_deduplicated.jsonl)")
     parser.add_argument("-k", "--key", default="url", help="Field to use as unique key (default: url)")
     parser.add_argument("-q", "--quiet", action="store_true", help="Suppress progress output")
+    parser.add_argument("--exact", action="store_true", help="Compare raw keys instead of 64-bit key hashes")
+    parser.add_argument("--stats", action="store_true", help="Print the most duplicated keys")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes (default: 1)")
     
     if len(sys.argv) == 1:
         parser.print_help()
@@ -111,7 +454,7 @@ def main():
     
     args = parser.parse_args()
     
-    deduplicate_jsonl_file(args.input_file, args.output, args.key, not args.quiet)
+    deduplicate_jsonl_file(args.input_file, args.output, args.key, not args.quiet, args.exact, args.stats, args.jobs)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+# DeepSeek request building and reply parsing shared by shopping.py and submit_batch.py.
+# Kept free of selenium and import-time side effects so submit_batch.py stays light.
+import os
+import re
+import json
+import time
+import hashlib
+
+# Precompiled price pattern, also used for prices read from product pages
+PRICE_RE = re.compile(r'(\$\d+(?:\.\d+)?)')
+_PRICE_HAS_DOLLAR_RE = re.compile(r'\$\d+')
+
+# Page parts that never hold the product title or price, removed before sending HTML to the LLM.
+# JSON-LD scripts are kept: their product name and offers.price are exactly what is asked for.
+_HTML_NOISE_RES = [
+    re.compile(r'<script\b(?![^>]*\btype\s*=\s*["\']?application/ld\+json)[^>]*>.*?</script>', re.S | re.I),
+    re.compile(r'<style\b[^>]*>.*?</style>', re.S | re.I),
+    re.compile(r'<svg\b[^>]*>.*?</svg>', re.S | re.I),
+    re.compile(r'<!--.*?-->', re.S),
+]
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Bump whenever the extraction prompt changes so cached responses are not reused
+PROMPT_VERSION = "2"
+DEEPSEEK_MODEL = "deepseek-chat"
+# Requests queued in --batch mode, uploaded later by submit_batch.py
+PENDING_BATCH_FILE = "shopping_output/pending_batch.jsonl"
+
+class LLMCache:
+    """On-disk cache of LLM extraction results, one JSON file per request hash"""
+    
+    def __init__(self, cache_dir="shopping_output/llm_cache", ttl_days=7):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_days * 24 * 3600
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    @staticmethod
+    def make_key(*parts):
+        """SHA-256 over length-prefixed parts, so different splits of the same bytes never collide"""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part.encode("utf-8")
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+    
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        try:
+            with open(os.path.join(self.cache_dir, f"{key}.json"), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expiresAt", 0) < time.time():
+            return None
+        return entry.get("value")
+    
+    def set(self, key, value):
+        """Store value under key with a fresh expiry time"""
+        entry = {"value": value, "expiresAt": time.time() + self.ttl_seconds}
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        # Write under a per-process name and rename, so scrapers running in parallel
+        # processes never read a half-written entry
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error writing LLM cache entry: {e}")
+
+# Description of each field DeepSeek can extract, used to build the prompt
+DEEPSEEK_FIELD_DESCRIPTIONS = {
+    'title': 'the product title as a string, without any other text',
+    'price': 'the product price as a string with a $ symbol (e.g. $99.99)',
+}
+# Output token budget per field; every decoded token adds latency
+DEEPSEEK_FIELD_MAX_TOKENS = {
+    'title': 40,
+    'price': 8,
+}
+# Example values shown to the model so JSON mode returns the expected shape
+DEEPSEEK_FIELD_EXAMPLES = {
+    'title': 'PlayStation 5 Console',
+    'price': '$99.99',
+}
+
+def missing_product_fields(product_info):
+    """
+    List the fields of a product record that DeepSeek should fill in
+    
+    Args:
+        product_info: Product record as saved by shopping.py
+        
+    Returns:
+        list: 'title' if the title is empty, 'price' if the price is missing, has no $ amount or is $0.00
+    """
+    missing = []
+    if not product_info.get('title'):
+        missing.append('title')
+    price = product_info.get('price') or ''
+    if not _PRICE_HAS_DOLLAR_RE.search(price) or price == '$0.00':
+        missing.append('price')
+    return missing
+
+def _clean_html_for_llm(html_content):
+    """Strip <script> (except JSON-LD), <style>, <svg> and comments from HTML and collapse whitespace"""
+    for pattern in _HTML_NOISE_RES:
+        html_content = pattern.sub('', html_content)
+    return _WHITESPACE_RE.sub(' ', html_content)
+
+def build_deepseek_request(html_content, fields):
+    """
+    Build the chat.completions arguments that ask DeepSeek for several product fields
+    
+    Args:
+        html_content: HTML content of the page
+        fields: Fields to extract; must all be keys of DEEPSEEK_FIELD_DESCRIPTIONS
+        
+    Returns:
+        tuple: (request keyword arguments, cache key for the request)
+    """
+    # Drop scripts, styles and whitespace first so the size cap keeps more visible content
+    html_content = _clean_html_for_llm(html_content)
+    
+    # Truncate HTML content if too large (most APIs have request size limits)
+    if len(html_content) > 100000:
+        html_content = html_content[:100000] + "..."
+    
+    # A single prompt asking for every missing field as one JSON object
+    example = json.dumps({field: DEEPSEEK_FIELD_EXAMPLES[field] for field in fields})
+    field_lines = "\n".join(f'- "{field}": {DEEPSEEK_FIELD_DESCRIPTIONS[field]}' for field in fields)
+    prompt = (
+        "Extract the following fields from this HTML content and return them as a JSON object:\n"
+        f"{field_lines}\n"
+        f"If you cannot find a field, set it to null. Return only the JSON object, e.g. {example}"
+    )
+    
+    request = {
+        "model": DEEPSEEK_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a precise HTML content extractor. Extract exactly what is asked for from the HTML."},
+            {"role": "user", "content": f"{prompt}\n\nHTML Content: {html_content}"}
+        ],
+        "temperature": 0.1,  # Low temperature for more deterministic responses
+        # Just enough for the values plus the JSON wrapper
+        "max_tokens": sum(DEEPSEEK_FIELD_MAX_TOKENS[field] for field in fields) + 10,
+        "response_format": {"type": "json_object"}
+    }
+    
+    # Identical page content and fields give the same answer, so reuse earlier responses
+    cache_key = LLMCache.make_key(html_content, ",".join(fields), DEEPSEEK_MODEL, PROMPT_VERSION)
+    return request, cache_key
+
+def parse_deepseek_reply(content, fields):
+    """
+    Turn the text of a DeepSeek reply into a dict of extracted fields
+    
+    Args:
+        content: Message content returned by the model
+        fields: Fields that were asked for
+        
+    Returns:
+        tuple: (Extracted values keyed by field, with fields that could not be extracted
+                omitted; whether the reply was a well-formed JSON object)
+    """
+    try:
+        extracted = json.loads(content)
+    except json.JSONDecodeError:
+        # Truncated or malformed JSON: salvage a price pattern if one is there
+        price_match = PRICE_RE.search(content)
+        return ({'price': price_match.group(1)} if price_match else {}), False
+    if not isinstance(extracted, dict):
+        return {}, False
+    
+    # Keep only requested fields with a usable value
+    result = {}
+    for field in fields:
+        value = extracted.get(field)
+        if value is None:
+            continue
+        value = str(value).strip()
+        if value and value.lower() not in ("none", "null"):
+            result[field] = value
+    return result, True
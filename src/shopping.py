@@ -2,7 +2,17 @@ import time
 import re
 import os
 import json
+import atexit
+import asyncio
 import argparse
+import multiprocessing.util
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where files are not locked
+    fcntl = None
+from collections import Counter
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
@@ -14,82 +24,356 @@ from selenium.webdriver.chrome.options import Options
 import logging
 from urllib.parse import urlparse
 import requests
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, RateLimitError
+from deepseek_requests import (
+    PRICE_RE, PENDING_BATCH_FILE, LLMCache,
+    build_deepseek_request, parse_deepseek_reply, missing_product_fields,
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-client = OpenAI(
-    base_url="https://api.deepseek.com/v1",
-    api_key= os.getenv("DEEPSEEK_API_KEY")
-)
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+# Maximum number of DeepSeek requests in flight at once
+DEEPSEEK_CONCURRENCY = 8
+# Retries with exponential backoff when DeepSeek rate-limits us (HTTP 429)
+DEEPSEEK_MAX_RETRIES = 3
+
 # Create results directory
 os.makedirs("shopping_output", exist_ok=True)
 
-def extract_with_deepseek(html_content, target_field):
+# undetected_chromedriver patches one shared chromedriver binary when a browser starts,
+# so starts in parallel worker processes (--workers) are serialized through this lock file
+CHROME_START_LOCK_FILE = "shopping_output/.chrome_start.lock"
+
+llm_cache = LLMCache()
+
+async def extract_fields_with_deepseek(request, cache_key, fields, aclient, semaphore):
     """
-    Use DeepSeek API to extract missing product information from HTML content
+    Use one DeepSeek API call to extract several missing product fields from HTML content
     
     Args:
-        html_content: HTML content of the page
-        target_field: Field to extract ('price' or 'title')
+        request: chat.completions arguments built by build_deepseek_request
+        cache_key: Cache key returned with the request
+        fields: Fields the request asks for ('price' and/or 'title')
+        aclient: AsyncOpenAI client pointed at the DeepSeek API
+        semaphore: asyncio.Semaphore bounding the number of concurrent requests
         
     Returns:
-        str: Extracted value or None if extraction failed
+        dict: Extracted values keyed by field; fields that could not be extracted are omitted
     """
-        
-    print(f"Calling DeepSeek API to extract missing {target_field}...")
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        print(f"DeepSeek API result served from cache: {cached}")
+        return cached
     
-    # Truncate HTML content if too large (most APIs have request size limits)
-    if len(html_content) > 100000:
-        html_content = html_content[:100000] + "..."
-    
-    # Prepare prompt based on target field
-    if target_field == 'price':
-        prompt = """Extract the product price from this HTML content. 
-        Return only the price as a string with a $ symbol (e.g. $99.99).
-        If you cannot find the price, return None."""
-    elif target_field == 'title':
-        prompt = """Extract the product title from this HTML content.
-        Return only the title as a string. Do not include any other text.
-        If you cannot find the title, return None."""
-    else:
-        return None
+    print(f"Calling DeepSeek API to extract missing {', '.join(fields)}...")
     
     try:
 
-        # Call the API using the client
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a precise HTML content extractor. Extract exactly what is asked for from the HTML."},
-                {"role": "user", "content": f"{prompt}\n\nHTML Content: {html_content}"}
-            ],
-            temperature=0.1,  # Low temperature for more deterministic responses
-            max_tokens=50     # We only need a short response
-        )
+        # Call the API using the client, backing off when rate-limited
+        for attempt in range(DEEPSEEK_MAX_RETRIES + 1):
+            try:
+                async with semaphore:
+                    response = await aclient.chat.completions.create(**request)
+                break
+            except RateLimitError:
+                if attempt == DEEPSEEK_MAX_RETRIES:
+                    raise
+                print(f"DeepSeek API rate limit hit, retrying in {2 ** attempt}s...")
+                await asyncio.sleep(2 ** attempt)
         
         # Extract the response content
         if response and response.choices:
-            extracted_text = response.choices[0].message.content.strip()
-            
-            # Process the response
-            if extracted_text.lower() == "none" or not extracted_text:
-                return None
-                
-            print(f"DeepSeek API extracted {target_field}: {extracted_text}")
-            return extracted_text
+            content = response.choices[0].message.content or ""
+            result, well_formed = parse_deepseek_reply(content, fields)
+            print(f"DeepSeek API extracted: {result}")
+            # Only cache well-formed replies; a truncated or malformed one (and the
+            # salvaged price from it) should be asked for again next time
+            if well_formed:
+                llm_cache.set(cache_key, result)
+            return result
         else:
             print(f"DeepSeek API returned empty response")
-            return None
+            return {}
             
     except Exception as e:
         print(f"Error calling DeepSeek API: {e}")
-        return None
+        return {}
+
+def _open_locked(path, mode, lock_type, **kwargs):
+    """Open a file and flock it, reopening it if submit_batch.py replaced it while we waited for the lock"""
+    while True:
+        f = open(path, mode, **kwargs)
+        if fcntl is None:
+            return f
+        fcntl.flock(f, lock_type)
+        try:
+            if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:  # Moved away and not recreated yet
+            pass
+        f.close()
+
+def queue_batch_requests(jobs, batch_file=PENDING_BATCH_FILE):
+    """
+    Append DeepSeek extraction requests to the pending Batch API input file
+    
+    Args:
+        jobs: List of (custom_id, request) tuples; custom_id is the product URL and request
+            the chat.completions arguments built by build_deepseek_request
+        batch_file: JSONL file later uploaded by submit_batch.py
+        
+    Returns:
+        int: Number of requests written
+    """
+    written = 0
+    # Unbuffered, so each request line is a single O_APPEND write and lines from
+    # scrapers in parallel processes cannot interleave. The exclusive lock keeps
+    # submit_batch.py from taking the file away while requests are being appended.
+    with _open_locked(batch_file, 'ab', fcntl and fcntl.LOCK_EX, buffering=0) as f:
+        for custom_id, request in jobs:
+            line = {"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": request}
+            f.write((json.dumps(line, ensure_ascii=False) + '\n').encode('utf-8'))
+            written += 1
+    return written
+
+# Event loop and DeepSeek client shared by every extraction batch, created on first use.
+# Keeping one loop lets the client's pooled HTTPS connections stay warm between pages.
+_llm_loop = None
+_llm_client = None
+
+def _get_llm_client():
+    """Return the shared (event loop, AsyncOpenAI client) pair, creating it on first use"""
+    global _llm_loop, _llm_client
+    if _llm_client is None:
+        _llm_loop = asyncio.new_event_loop()
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=httpx.Timeout(60.0),
+        )
+        _llm_client = AsyncOpenAI(
+            base_url=DEEPSEEK_BASE_URL,
+            api_key=os.getenv("DEEPSEEK_API_KEY"),
+            http_client=http_client,
+        )
+        atexit.register(_close_llm_client)
+    return _llm_loop, _llm_client
+
+def _close_llm_client():
+    """Close the shared DeepSeek client and its event loop"""
+    global _llm_loop, _llm_client
+    if _llm_client is not None:
+        _llm_loop.run_until_complete(_llm_client.close())
+        _llm_loop.close()
+        _llm_loop = _llm_client = None
+
+def extract_fields_for_products(jobs, concurrency=DEEPSEEK_CONCURRENCY):
+    """
+    Run DeepSeek field extraction for several products concurrently
+    
+    Args:
+        jobs: List of (request, cache_key, fields) tuples, one per product; request and
+            cache_key are what build_deepseek_request returns for those fields
+        concurrency: Maximum number of requests in flight at once
+        
+    Returns:
+        list: One dict of extracted fields per job, in the same order as jobs
+    """
+    if not jobs:
+        return []
+    loop, aclient = _get_llm_client()
+    
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(
+            extract_fields_with_deepseek(request, cache_key, fields, aclient, semaphore)
+            for request, cache_key, fields in jobs
+        ))
+    
+    return loop.run_until_complete(run_all())
+
+# Class attribute of every visible li/div/article/section element, computed in the browser
+VISIBLE_CLASSES_JS = """
+return Array.from(document.querySelectorAll('li, div, article, section'))
+    .filter(e => {
+        const r = e.getBoundingClientRect();
+        const s = getComputedStyle(e);
+        return r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none';
+    })
+    .map(e => e.getAttribute('class') || '');
+"""
+
+# True once the page has finished loading and shows more than 10 list items/articles
+SEARCH_RESULTS_READY_JS = """
+return document.readyState === 'complete' && document.querySelectorAll('li, article').length > 10;
+"""
+
+# If the page has lazy-loaded content, scroll down by arguments[0] pixels to trigger it;
+# returns whether it scrolled
+SCROLL_IF_LAZY_JS = """
+if (!document.querySelector('img[loading="lazy"], [data-src]')) return false;
+window.scrollBy(0, arguments[0]);
+return true;
+"""
+
+# Scroll down by arguments[0] pixels and report whether the bottom of the page is reached
+SCROLL_AND_CHECK_BOTTOM_JS = """
+window.scrollBy(0, arguments[0]);
+return (window.innerHeight + window.scrollY) >= document.body.scrollHeight;
+"""
+
+# Visibility, enabled state and the attributes the search box heuristics read, for each
+# element in arguments[0]; innerText is left out since it forces layout of whole subtrees
+BATCH_PROPS_JS = """
+return arguments[0].map(e => {
+    const r = e.getBoundingClientRect();
+    const s = getComputedStyle(e);
+    return {
+        visible: r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none',
+        enabled: !e.disabled,
+        type: e.type || '',
+        id: e.id || '',
+        cls: e.getAttribute('class') || '',
+        placeholder: e.getAttribute('placeholder') || ''
+    };
+});
+"""
+
+# Return the href of the most prominent link inside a container:
+# 1. the container itself if it is a visible link;
+# 2. otherwise visible links with a real href that have more than 5 characters of text/title,
+#    are at least 40x40, or sit in a container larger than 50x50,
+#    ranked by text length and then by area
+_PICK_MAIN_LINK_FN = """
+function pickMainLink(container) {
+    const visible = e => {
+        const r = e.getBoundingClientRect();
+        const s = getComputedStyle(e);
+        return r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none';
+    };
+    if (container.tagName.toLowerCase() === 'a' && container.href && visible(container)) {
+        return container.href;
+    }
+    const c = container.getBoundingClientRect();
+    const containerLarge = c.width > 50 && c.height > 50;
+    const candidates = [];
+    for (const a of container.querySelectorAll('a')) {
+        if (!a.href || a.href.includes('javascript:void(0)') || !visible(a)) continue;
+        const r = a.getBoundingClientRect();
+        const text = (a.innerText || '').trim();
+        const title = a.getAttribute('title') || '';
+        if (text.length > 5 || title.length > 5 || (r.width >= 40 && r.height >= 40) || containerLarge) {
+            candidates.push({a: a, textLength: text.length, area: r.width * r.height});
+        }
+    }
+    candidates.sort((x, y) => (y.textLength - x.textLength) || (y.area - x.area));
+    return candidates.length ? candidates[0].a.href : null;
+}
+"""
+# Main link href of one container (arguments[0])
+PICK_MAIN_LINK_JS = _PICK_MAIN_LINK_FN + "return pickMainLink(arguments[0]);"
+# Main link hrefs of a list of containers (arguments[0]), in the same order
+PICK_MAIN_LINKS_JS = _PICK_MAIN_LINK_FN + "return arguments[0].map(pickMainLink);"
+
+# Idle browsers kept for reuse by later ProductScraper instances, keyed by headless flag.
+# The pool is per process; scrapers in separate processes share no state.
+_driver_pool = {}
+_pool_finalizer_pid = None
+
+def shutdown_pool():
+    """Quit every pooled browser"""
+    for pool in _driver_pool.values():
+        while pool:
+            driver = pool.pop()
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.warning(f"Error closing pooled browser: {e}")
+
+atexit.register(shutdown_pool)
+
+def _register_pool_finalizer():
+    """Quit pooled browsers when this process exits, including multiprocessing/
+    concurrent.futures worker processes, which exit without running atexit hooks"""
+    global _pool_finalizer_pid
+    if _pool_finalizer_pid != os.getpid():
+        _pool_finalizer_pid = os.getpid()
+        multiprocessing.util.Finalize(None, shutdown_pool, exitpriority=10)
 
 class ProductScraper:
+    """Search a shopping website and scrape product details
+    
+    Instances keep all per-run state on self, so one scraper per process can run
+    several websites in parallel (e.g. with concurrent.futures.ProcessPoolExecutor).
+    """
+    # Substrings of id/class/placeholder that mark a search box
+    _SEARCH_TERMS = ("search", "query", "keyword", "find")
+    
+    # Common search box attribute list
+    _SEARCH_SELECTORS = (
+        # Common name attributes
+        (By.NAME, "q"), (By.NAME, "query"), (By.NAME, "search"), (By.NAME, "searchTerm"), (By.NAME, "keyword"),
+        # Common placeholder attributes
+        (By.XPATH, "//input[contains(@placeholder, 'search')]"),
+        # Leave out the Chinese placeholder search
+        # Common IDs and classes
+        (By.ID, "search"), (By.ID, "searchbox"), (By.ID, "search-input"),
+        (By.CSS_SELECTOR, ".search-box"), (By.CSS_SELECTOR, ".search-input"),
+        # Common role attributes
+        (By.CSS_SELECTOR, "[role='search'] input"),
+        # Data attributes
+        (By.CSS_SELECTOR, "[data-test*='search'] input"),
+        (By.CSS_SELECTOR, "[data-testid*='search'] input"),
+        # General input fields
+        (By.TAG_NAME, "input")
+    )
+
+    # Common next page button selectors
+    _NEXT_BUTTON_SELECTORS = (
+        # Find by data-testid or data-test attributes
+        (By.CSS_SELECTOR, "[data-testid='NextPage'], [data-test='next'], [data-testid*='next']"),
+        # Find by aria-label attribute (case insensitive)
+        (By.CSS_SELECTOR, "[aria-label*='next' i], [aria-label*='Next' i]"),
+        # Next page related class names
+        (By.CSS_SELECTOR, "[class*='next'], .styles_next"),
+        (By.XPATH, "//a[.//i[contains(@class, 'ChevronRight')]] | //button[.//svg]"),
+        (By.XPATH, "//*[contains(translate(text(), 'NEXT', 'next'), 'next')]"),
+        # Generic pagination buttons
+        (By.CSS_SELECTOR, ".pagination .next, .pagination-next"),
+    )
+
+    # Product title selectors
+    _TITLE_SELECTORS = (
+        (By.CSS_SELECTOR, "h1"), 
+        (By.CSS_SELECTOR, ".product-title, .product-name")
+    )
+    # Seconds to wait for a client-rendered title before probing the selectors,
+    # since the implicit wait is off and a miss sends the product to DeepSeek
+    _TITLE_WAIT_SECONDS = 3
+
+    # Product price selectors
+    _PRICE_SELECTORS = (
+        # Find by itemprop="price" attribute
+        (By.CSS_SELECTOR, "[itemprop='price']"),
+        (By.XPATH, "//*[contains(text(), '$')]"),
+        # Find by data-testid="price-wrap"
+        (By.CSS_SELECTOR, "[data-testid='price-wrap']"),
+        # Original selectors
+        (By.CSS_SELECTOR, ".price, .product-price"),
+        (By.CSS_SELECTOR, "[data-test*='price'], [data-testid*='price']"),
+        (By.XPATH, "//span[contains(@class, 'price')]")
+    )
+
+    # Buffered product records are flushed to disk after this many writes
+    _JSONL_FLUSH_EVERY = 32
+
     def __init__(self, headless=False):
         """Initialize scraper"""
+        # Results file handles kept open per domain, and writes since the last flush
+        self._jsonl_handles = {}
+        self._unflushed_writes = 0
         options = Options()
         if headless:
             options.add_argument('--headless')
@@ -97,171 +381,164 @@ class ProductScraper:
         options.add_argument('--disable-dev-shm-usage')
         options.add_argument('--disable-blink-features=AutomationControlled')
         options.add_argument('--start-maximized')
+        # undetected_chromedriver starts Chrome itself, without chromedriver's default of
+        # disabling the popup blocker, which would block the window.open product tabs
+        options.add_argument('--disable-popup-blocking')
         
-        # Initialize browser
-        self.driver = uc.Chrome(version_main=135, options=options)
-        self.driver.implicitly_wait(10)
+        # Reuse a pooled browser when possible; Chrome cold start takes seconds
+        self.headless = headless
+        pool = _driver_pool.setdefault(headless, [])
+        if pool:
+            self.driver = pool.pop()
+        else:
+            with open(CHROME_START_LOCK_FILE, "a") as start_lock:
+                if fcntl is not None:
+                    fcntl.flock(start_lock, fcntl.LOCK_EX)  # Released when the file is closed
+                self.driver = uc.Chrome(version_main=135, options=options)
+            _register_pool_finalizer()
+            # No implicit wait: most selectors are probes expected to miss, and each miss
+            # would otherwise block for the full timeout. Real waits use WebDriverWait.
+            self.driver.implicitly_wait(0)
         self.results = []
         
+    def close(self):
+        """Flush and close the per-domain results files"""
+        for fh in self._jsonl_handles.values():
+            try:
+                fh.close()
+            except OSError as e:
+                logger.warning(f"Error closing results file: {e}")
+        self._jsonl_handles.clear()
+        self._unflushed_writes = 0
+        
     def __del__(self):
-        """Close browser"""
+        """Close results files, reset the browser and return it to the pool; shutdown_pool() quits it at exit"""
+        if hasattr(self, '_jsonl_handles'):
+            self.close()
         if hasattr(self, 'driver'):
-            self.driver.quit()
+            try:
+                self.driver.delete_all_cookies()
+                self.driver.get("about:blank")
+                _driver_pool.setdefault(self.headless, []).append(self.driver)
+            except Exception:
+                self.driver.quit()
     
     def find_search_box(self):
         """Try multiple methods to find the search box"""
-        # Common search box attribute list
-        search_selectors = [
-            # Common name attributes
-            (By.NAME, "q"), (By.NAME, "query"), (By.NAME, "search"), (By.NAME, "searchTerm"), (By.NAME, "keyword"),
-            # Common placeholder attributes
-            (By.XPATH, "//input[contains(@placeholder, 'search')]"),
-            # Leave out the Chinese placeholder search
-            # Common IDs and classes
-            (By.ID, "search"), (By.ID, "searchbox"), (By.ID, "search-input"),
-            (By.CSS_SELECTOR, ".search-box"), (By.CSS_SELECTOR, ".search-input"),
-            # Common role attributes
-            (By.CSS_SELECTOR, "[role='search'] input"),
-            # Data attributes
-            (By.CSS_SELECTOR, "[data-test*='search'] input"),
-            (By.CSS_SELECTOR, "[data-testid*='search'] input"),
-            # General input fields
-            (By.TAG_NAME, "input")
-        ]
-        
         # Try to find the search box
-        for selector_type, selector in search_selectors:
+        for selector_type, selector in self._SEARCH_SELECTORS:
             try:
                 elements = self.driver.find_elements(selector_type, selector)
-                for element in elements:
-                    if element.is_displayed() and element.get_attribute("type") != "hidden":
+                for element, props in zip(elements, self._batch_props(elements)):
+                    if props['visible'] and props['type'] != "hidden":
                         # Check if this is a search box
-                        if self._is_likely_search_box(element):
+                        if self._is_likely_search_box(props):
                             return element
             except:
                 continue
         
         return None
     
-    def _is_likely_search_box(self, element):
-        """Determine if an element is likely a search box"""
+    def _is_likely_search_box(self, props):
+        """Determine if an element is likely a search box, given its _batch_props() record"""
         # Check element attributes
-        element_type = element.get_attribute("type")
+        element_type = props['type']
         if element_type in ["search", "text"]:
             return True
             
         # Check element ID or class name
-        element_id = element.get_attribute("id") or ""
-        element_class = element.get_attribute("class") or ""
-        search_terms = ["search", "query", "keyword", "find"]
-        
-        for term in search_terms:
+        element_id = props['id']
+        element_class = props['cls']
+        for term in self._SEARCH_TERMS:
             if term in element_id.lower() or term in element_class.lower():
                 return True
                 
         # Check placeholder text
-        placeholder = element.get_attribute("placeholder") or ""
-        if any(term in placeholder.lower() for term in search_terms):
+        placeholder = props['placeholder']
+        if any(term in placeholder.lower() for term in self._SEARCH_TERMS):
             return True
             
         return False
     
+    def _batch_props(self, elements):
+        """Read size, visibility and common attributes of many elements in one WebDriver round-trip
+        
+        Returns:
+            list: One dict per element (see BATCH_PROPS_JS), in the same order as elements
+        """
+        if not elements:
+            return []
+        return self.driver.execute_script(BATCH_PROPS_JS, elements)
+    
     def _get_main_link_from_container(self, container_element):
-        logger.info(f"  Enter _get_main_link_from_container for element: {container_element.tag_name} class='{container_element.get_attribute('class')}'")
+        """Return the href of the container's main product link, or None
+        
+        A URL string stays valid after the listing scrolls or re-renders, unlike a WebElement.
+        """
         try:
-            if container_element.tag_name == 'a' and container_element.get_attribute('href'):
-                logger.info("    Priority 1: Container is itself a link.")
-                if container_element.is_displayed():
-                    logger.info(f"      Container is itself a link and visible: {container_element.get_attribute('href')}")
-                    return container_element
-            
-            
-            logger.info("    Priority 3: Looking for other prominent links...")
-            all_links_in_container = container_element.find_elements(By.TAG_NAME, 'a')
-            logger.info(f"    Priority 3: Found {len(all_links_in_container)} 'a' tags in container.")
-            potential_links = []
-            for link_idx, link in enumerate(all_links_in_container):
-                logger.info(f"      P3 Link {link_idx+1}: Checking text and size...")
-                href = link.get_attribute('href')
-                if link.is_displayed() and href and "javascript:void(0)" not in href:
-                    text_content = link.text.strip()
-                    title_attr = link.get_attribute('title') or ""
-                    if len(text_content) > 5 or len(title_attr) > 5:
-                        logger.info(f"        P3 Link {link_idx+1} has significant text/title.")
-                        potential_links.append(link)
-                    elif self._is_reasonable_size(link, check_parent=True, parent_container=container_element):
-                        logger.info(f"        P3 Link {link_idx+1} has reasonable size.")
-                        potential_links.append(link)
-                    else:
-                        logger.info(f"        P3 Link {link_idx+1} no significant text/title and not reasonable size.")
-            
-            if potential_links:
-                potential_links.sort(key=lambda l: (len(l.text.strip()), l.size['width'] * l.size['height'] if l.size else 0), reverse=True)
-                logger.info(f"    Priority 3: Sorted {len(potential_links)} potential links. Top one: {potential_links[0].get_attribute('href')}")
-                return potential_links[0]
-            else:
-                logger.info("    Priority 3: No potential links found after filtering.")
+            # Link filtering and ranking run in the browser, one round-trip per container
+            href = self.driver.execute_script(PICK_MAIN_LINK_JS, container_element)
+            if href:
+                logger.info(f"    Picked main link: {href}")
+                return href
+            logger.info("    No potential links found after filtering.")
 
         except NoSuchElementException:
             logger.info("  _get_main_link_from_container: NoSuchElementException")
+        except StaleElementReferenceException:
+            # Callers holding a container list re-find it, see _main_link_at()
+            raise
         except Exception as e:
             logger.error(f"  _get_main_link_from_container error: {e}", exc_info=True)
         logger.info(f"  Exit _get_main_link_from_container, returning None")
         return None
 
-    def _is_reasonable_size(self, element, check_parent=False, parent_container=None):
+    def _main_link_at(self, containers, idx, selector_type, selector_value):
+        """Main link of containers[idx], re-finding the container list only if it has gone stale
+        
+        Returns:
+            (href or None, container list to use from now on) tuple
+        """
+        if idx >= len(containers):
+            return None, containers
         try:
-            # First check if element is visible
-            if not element.is_displayed():
-                return False
-                
-            # Get element size
-            size = element.size
-            
-            # Check element's own size
-            if size['width'] < 40 or size['height'] < 40:  # Minimum reasonable size threshold
-                # If element is small but it's a link and parent container size is reasonable, could still be valid
-                if check_parent and parent_container and element.tag_name == 'a':
-                    try:
-                        parent_size = parent_container.size
-                        if parent_size['width'] > 50 and parent_size['height'] > 50:
-                            return True  # Parent container size is reasonable, consider it a valid element
-                    except:
-                        pass
-                return False  # Element size too small
-                
-            return True
-            
-        except Exception as e:
-            logger.info(f"Error checking element size: {e}")
-            return False  # Default to False on error
+            return self._get_main_link_from_container(containers[idx]), containers
+        except StaleElementReferenceException:
+            logger.info(f"  Container {idx+1} is stale, re-finding containers ('{selector_value}')")
+            containers = self.driver.find_elements(selector_type, selector_value)
+            if idx >= len(containers):
+                return None, containers
+            try:
+                return self._get_main_link_from_container(containers[idx]), containers
+            except StaleElementReferenceException:
+                return None, containers
 
     def find_products(self):
+        """Find the repeated product containers on a results page and collect their product links
+        
+        Returns:
+            (product hrefs, selector type, selector value) tuple, or (None, None, None) if no product list is found
+        """
         min_products_for_list = 10  
         # candidate_product_links = [] # Not needed here as we return on first success
 
         # 1. Count CSS class frequency
-        class_counts = {}
-        elements_to_analyze = self.driver.find_elements(By.XPATH, "//li | //div | //article | //section")
-        logger.info(f"Analyzing {len(elements_to_analyze)} major elements on the page to find repeated classes...")
+        # Visibility and class names are read in the browser with one round-trip
+        # instead of two WebDriver calls per element
+        try:
+            class_strings = self.driver.execute_script(VISIBLE_CLASSES_JS) or []
+        except Exception as e:
+            logger.warning(f"Error getting element classes: {e}")
+            class_strings = []
+        logger.info(f"Analyzing {len(class_strings)} visible major elements on the page to find repeated classes...")
 
-        for element in elements_to_analyze:
-            try:
-                if not element.is_displayed():
-                    continue
-                classes_str = element.get_attribute("class")
-                if classes_str:
-                    sorted_classes = tuple(sorted(filter(None, classes_str.split())))
-                    if not sorted_classes:
-                        continue
-                    class_counts[sorted_classes] = class_counts.get(sorted_classes, 0) + 1
-            except Exception as e:
-                logger.info(f"Error getting element class: {e}")
-                continue
+        # split() drops empty names, so whitespace-only class attributes give an empty tuple
+        class_counts = Counter(tuple(sorted(classes_str.split())) for classes_str in class_strings if classes_str)
+        class_counts.pop((), None)
         
-        sorted_frequent_classes = sorted([
-            (k,v) for k,v in class_counts.items() if v >= min_products_for_list
-        ], key=lambda item: item[1], reverse=True)
+        sorted_frequent_classes = [
+            (k,v) for k,v in class_counts.most_common() if v >= min_products_for_list
+        ]
         
         logger.info(f"Found {len(sorted_frequent_classes)} class combinations with frequency >= {min_products_for_list}")
         print(sorted_frequent_classes)
@@ -285,17 +562,28 @@ class ProductScraper:
                     consecutive_none_returns = 0 # Initialize consecutive None counter
                     scroll_step = self.driver.execute_script("return window.innerHeight") 
                     last_main_link = None
-                    for idx, container in enumerate(visible_containers):
-                        logger.info(f"  Container {idx+1}/{len(visible_containers)}: Starting to call _get_main_link_from_container")
-                        main_link = self._get_main_link_from_container(container)
+                    # Links of all containers read in one round-trip; only valid for this exact container list
+                    try:
+                        prefetched_links = self.driver.execute_script(PICK_MAIN_LINKS_JS, visible_containers)
+                    except Exception as e:
+                        logger.info(f"Could not prefetch container links, falling back to one call per container: {e}")
+                        prefetched_links = None
+                    prefetched_for = visible_containers
+                    for idx in range(len(visible_containers)):
+                        main_link = None
+                        if prefetched_links and prefetched_for is visible_containers:
+                            main_link = prefetched_links[idx]
+                        if not main_link:
+                            # Missing links are re-read live: earlier scrolls may have rendered them since
+                            logger.info(f"  Container {idx+1}/{len(visible_containers)}: Starting to call _get_main_link_from_container")
+                            main_link, visible_containers = self._main_link_at(visible_containers, idx, class_selector_type, class_selector_value)
                         logger.info(f"  Container {idx+1}/{len(visible_containers)}: _get_main_link_from_container returned {'link' if main_link else 'None'}")
                         
                         if main_link:
                             consecutive_none_returns = 0 # Reset counter
-                            href = main_link.get_attribute('href')
-                            if href and href not in processed_hrefs_for_group:
+                            if main_link not in processed_hrefs_for_group:
                                 links_from_this_class_group.append(main_link)
-                                processed_hrefs_for_group.add(href)
+                                processed_hrefs_for_group.add(main_link)
                             last_main_link = main_link
                         else:
                             # Only try scrolling if previous was successful but current failed
@@ -303,33 +591,29 @@ class ProductScraper:
                                 # Continue scrolling until link is found or bottom is confirmed
                                 max_scroll_attempts = 5  # Maximum scroll attempts
                                 scroll_attempts = 0
-                                initial_height = self.driver.execute_script("return document.body.scrollHeight")
                                 
                                 while scroll_attempts < max_scroll_attempts:
-                                    # Scroll a bit and wait
-                                    self.driver.execute_script(f"window.scrollBy(0, {scroll_step});")
+                                    # Scroll a bit and check for the bottom of the page in the same round-trip
+                                    reached_bottom = self.driver.execute_script(SCROLL_AND_CHECK_BOTTOM_JS, scroll_step)
                                     logger.info(f"Previous container was successful but container {idx+1} failed, scroll attempt {scroll_attempts+1}/{max_scroll_attempts}")
                                     time.sleep(0.7)  # Give page time to load
                                     
-                                    # Check if we've reached bottom of page
-                                    new_height = self.driver.execute_script("return document.body.scrollHeight")
-
-                                    
                                     # Try to get link again
-                                    main_link = self._get_main_link_from_container(container)
+                                    main_link, visible_containers = self._main_link_at(visible_containers, idx, class_selector_type, class_selector_value)
                                     logger.info(f"  Container {idx+1} after scroll retry #{scroll_attempts+1}: {'successful' if main_link else 'failed'}")
                                     
                                     if main_link:  # Successfully got link, exit loop
                                         consecutive_none_returns = 0
-                                        href = main_link.get_attribute('href')
-                                        if href and href not in processed_hrefs_for_group:
+                                        if main_link not in processed_hrefs_for_group:
                                             links_from_this_class_group.append(main_link)
-                                            processed_hrefs_for_group.add(href)
+                                            processed_hrefs_for_group.add(main_link)
                                         last_main_link = main_link
                                         break
                                     
-                                    initial_height = new_height
                                     scroll_attempts += 1
+                                    if reached_bottom:
+                                        logger.info("    Reached bottom of page, no more scrolling")
+                                        break
                                 
                                 # Only count as None if all scroll attempts failed
                                 if not main_link:
@@ -364,7 +648,7 @@ class ProductScraper:
         """Find next page button, supporting exclusion of already tried buttons
         
         Args:
-            exclude_buttons: Set of buttons to exclude, like already tried ones
+            exclude_buttons: Set of WebDriver element ids (WebElement.id) to exclude, like already tried buttons
             return_all: If True, return all matching buttons list; otherwise return first matching button
             
         Returns:
@@ -373,34 +657,20 @@ class ProductScraper:
         """
         if exclude_buttons is None:
             exclude_buttons = set()
-            
-        # Common next page button selectors
-        next_button_selectors = [
-            # Find by data-testid or data-test attributes
-            (By.CSS_SELECTOR, "[data-testid='NextPage'], [data-test='next'], [data-testid*='next']"),
-            # Find by aria-label attribute (case insensitive)
-            (By.CSS_SELECTOR, "[aria-label*='next' i], [aria-label*='Next' i]"),
-            # Next page related class names
-            (By.CSS_SELECTOR, "[class*='next'], .styles_next"),
-            (By.XPATH, "//a[.//i[contains(@class, 'ChevronRight')]] | //button[.//svg]"),
-            (By.XPATH, "//*[contains(translate(text(), 'NEXT', 'next'), 'next')]"),
-            # Generic pagination buttons
-            (By.CSS_SELECTOR, ".pagination .next, .pagination-next"),
-        ]
         
         if return_all:
             all_buttons = []
         
         # Try to find next page button
-        for selector_type, selector in next_button_selectors:
+        for selector_type, selector in self._NEXT_BUTTON_SELECTORS:
             try:
                 elements = self.driver.find_elements(selector_type, selector)
-                for element in elements:
+                for element, props in zip(elements, self._batch_props(elements)):
                     # Skip already excluded buttons
-                    if element in exclude_buttons:
+                    if element.id in exclude_buttons:
                         continue
                         
-                    if element.is_displayed() and element.is_enabled():
+                    if props['visible'] and props['enabled']:
                         if return_all:
                             all_buttons.append(element)
                         else:
@@ -416,29 +686,27 @@ class ProductScraper:
     def find_alternative_next_buttons(self, exclude_buttons=None):
         return self.find_next_page_button(exclude_buttons=exclude_buttons, return_all=True)
     
-    def extract_product_info(self):
-        product_info = {}
+    def extract_product_info(self, pending_llm=None):
+        """Extract title, price and URL from the current product page
         
-        title_selectors = [
-            (By.CSS_SELECTOR, "h1"), 
-            (By.CSS_SELECTOR, ".product-title, .product-name")
-        ]
+        Args:
+            pending_llm: Optional list. If given, fields that need the DeepSeek fallback are not
+                extracted now; (product_info, (request, cache_key, missing_fields)) is appended
+                to the list so the caller can run all fallbacks of a page concurrently
+                
+        Returns:
+            dict: Product information
+        """
+        product_info = {}
         
-        # Try to get price
-        price_selectors = [
-            # Find by itemprop="price" attribute
-            (By.CSS_SELECTOR, "[itemprop='price']"),
-            (By.XPATH, "//*[contains(text(), '$')]"),
-            # Find by data-testid="price-wrap"
-            (By.CSS_SELECTOR, "[data-testid='price-wrap']"),
-            # Original selectors
-            (By.CSS_SELECTOR, ".price, .product-price"),
-            (By.CSS_SELECTOR, "[data-test*='price'], [data-testid*='price']"),
-            (By.XPATH, "//span[contains(@class, 'price')]")
-        ]
+        try:
+            WebDriverWait(self.driver, self._TITLE_WAIT_SECONDS).until(
+                EC.any_of(*(EC.presence_of_element_located(locator) for locator in self._TITLE_SELECTORS)))
+        except TimeoutException:
+            print(f"No title element rendered within {self._TITLE_WAIT_SECONDS}s")
         
         # Get title
-        for selector_type, selector in title_selectors:
+        for selector_type, selector in self._TITLE_SELECTORS:
            
             try:
                 title_element = self.driver.find_element(selector_type, selector)
@@ -452,7 +720,7 @@ class ProductScraper:
                 continue
                 
         # Get price
-        for selector_type, selector in price_selectors:
+        for selector_type, selector in self._PRICE_SELECTORS:
             try:
                 print(f"Trying price selector: {selector_type}, '{selector}'")
                 price_element = self.driver.find_element(selector_type, selector)
@@ -478,7 +746,7 @@ class ProductScraper:
                     
                     # Try to extract price
                     print(f"Attempting to extract price pattern from: '{price_text}'")
-                    price_match = re.search(r'(\$\d+(\.\d+)?)', price_text)
+                    price_match = PRICE_RE.search(price_text)
                     if price_match:
                         product_info['price'] = price_match.group(1)
                         print(f"Successfully extracted price: {product_info['price']}")
@@ -495,47 +763,40 @@ class ProductScraper:
         
         # Use DeepSeek API for missing information if URL is available
         if product_info.get('url'):
-            # If title is missing, try to extract it with DeepSeek
-            if not product_info.get('title'):
-                print("Title not found using selectors, trying DeepSeek API...")
-                try:
-                    # Get page HTML
-                    page_html = self.driver.page_source
-                    extracted_title = extract_with_deepseek(page_html, 'title')
-                    if extracted_title:
-                        product_info['title'] = extracted_title
-                        print(f"Successfully extracted title with DeepSeek API: {extracted_title}")
-                except Exception as e:
-                    print(f"Error using DeepSeek API for title extraction: {e}")
+            # Title if empty, price if missing, without a $ amount or $0.00; the same
+            # rule decides which fields submit_batch.py may fill in later
+            missing_fields = missing_product_fields(product_info)
             
-            # If price is missing, invalid, or $0.00, try to extract it with DeepSeek
-            has_valid_price = False
-            if product_info.get('price'):
-                # Check if price has $ and digits
-                price_str = product_info.get('price', '')
-                if re.search(r'\$\d+', price_str):
-                    # If price is $0.00, still consider it invalid
-                    if price_str == '$0.00' :
-                        print("Price is $0.00, considering as invalid price")
-                        has_valid_price = False
-                    else:
-                        has_valid_price = True
-                    
-            if not has_valid_price:
-                print("Valid price not found or price is $0.00, trying DeepSeek API...")
+            # Fetch the page HTML once for both fallbacks; page_source serializes the whole DOM
+            page_html = None
+            if missing_fields:
                 try:
-                    # Get page HTML
                     page_html = self.driver.page_source
-                    extracted_price = extract_with_deepseek(page_html, 'price')
-                    if extracted_price:
-                        product_info['price'] = extracted_price
-                        print(f"Successfully extracted price with DeepSeek API: {extracted_price}")
                 except Exception as e:
-                    print(f"Error using DeepSeek API for price extraction: {e}")
+                    print(f"Error getting page HTML for DeepSeek API: {e}")
+            
+            if page_html:
+                # Ask for every missing field in a single DeepSeek call
+                if 'title' in missing_fields:
+                    print("Title not found using selectors, trying DeepSeek API...")
+                if 'price' in missing_fields:
+                    print("Valid price not found or price is $0.00, trying DeepSeek API...")
+                
+                # Build the request now, so only the cleaned and capped HTML is kept
+                # rather than the full page source of every pending product
+                request, cache_key = build_deepseek_request(page_html, missing_fields)
+                job = (request, cache_key, missing_fields)
+                if pending_llm is not None:
+                    pending_llm.append((product_info, job))
+                else:
+                    extracted = extract_fields_for_products([job])[0]
+                    for field, value in extracted.items():
+                        product_info[field] = value
+                        print(f"Successfully extracted {field} with DeepSeek API: {value}")
         
         return product_info
         
-    def search_and_scrape(self, starting_website, search_term="PlayStation", max_pages=5, max_products_per_page=100, scroll_speed="slow"):
+    def search_and_scrape(self, starting_website, search_term="PlayStation", max_pages=5, max_products_per_page=100, scroll_speed="slow", tabs=1, batch=False):
         """Search for products and scrape details. Results will be saved to a separate JSON file for that website.
         
         Args:
@@ -544,11 +805,18 @@ class ProductScraper:
             max_pages: Maximum pages to scrape
             max_products_per_page: Maximum products to scrape per page
             scroll_speed: Scroll speed, "slow" for slow scrolling, "fast" for fast scrolling
+            tabs: Number of product pages to load at once in separate tabs; 1 clicks through products one by one
+            batch: If True, missing fields are queued for the DeepSeek Batch API (see submit_batch.py)
+                instead of being extracted now; products are saved without them
         """
         logger.info(f"Starting to scrape product information from {starting_website}")
         domain = urlparse(starting_website).netloc
         # Track successfully scraped products count
         products_count = 0
+        # Product URLs already visited on earlier pages, e.g. promoted items repeated on every page
+        visited_hrefs = set()
+        # Results path and directory are set up once per site, not per product
+        self._open_results_file(domain)
         
         try:
             self.driver.get(starting_website)
@@ -563,144 +831,104 @@ class ProductScraper:
             logger.info(f"Searching for {search_term}...")
             search_box.clear()
             search_box.send_keys(search_term)
+            url_before_search = self.driver.current_url
             search_box.send_keys(Keys.RETURN)
-            time.sleep(8) # Wait after search
+            # Wait until the results page has loaded and rendered a list, instead of a fixed 8s
+            try:
+                WebDriverWait(self.driver, 15).until(
+                    lambda d: d.current_url != url_before_search and d.execute_script(SEARCH_RESULTS_READY_JS))
+            except TimeoutException:
+                logger.warning("Search results not detected within 15s, continuing anyway")
             
+            previous_container = None
             for page_num in range(max_pages):
                 logger.info(f"Processing page {page_num + 1} results")
+                if page_num > 0:
+                    # Pagination returns as soon as the URL changes, and client-routed sites keep
+                    # the old results on screen for a while, so wait for them to be replaced
+                    try:
+                        WebDriverWait(self.driver, 10).until(
+                            lambda d: (previous_container is None or EC.staleness_of(previous_container)(d))
+                            and d.execute_script(SEARCH_RESULTS_READY_JS))
+                    except TimeoutException:
+                        logger.warning("Next page results not detected within 10s, continuing anyway")
                 
                 logger.info("Page scrolling complete.")
                 
-                product_elements, successful_selector_type, successful_selector_value = self.find_products()
+                product_hrefs, successful_selector_type, successful_selector_value = self.find_products()
                 
-                if not product_elements:
+                if not product_hrefs:
                     logger.warning(f"No product list found on page {page_num + 1} or major strategy failed")
                     break 
                     
-                logger.info(f"Found {len(product_elements)} products (using selector: {successful_selector_type}, '{successful_selector_value}')")
-                products_to_process_on_this_page = min(max_products_per_page, len(product_elements))
+                logger.info(f"Found {len(product_hrefs)} products (using selector: {successful_selector_type}, '{successful_selector_value}')")
+                # Skip products seen on earlier pages before paying for their page load
+                new_hrefs = [href for href in product_hrefs if href not in visited_hrefs]
+                if len(new_hrefs) < len(product_hrefs):
+                    logger.info(f"Skipping {len(product_hrefs) - len(new_hrefs)} products already visited on earlier pages")
+                product_hrefs = new_hrefs
+                products_to_process_on_this_page = min(max_products_per_page, len(product_hrefs))
+                # Marked as visited before loading, so a product whose extraction fails is not retried
+                visited_hrefs.update(product_hrefs[:products_to_process_on_this_page])
                 logger.info(f"Will process {products_to_process_on_this_page} products on this page")
-                processed_product_hrefs_on_page = set()
-
-                for i in range(products_to_process_on_this_page):
-                    current_product_element_to_click = None
-                    product_description_for_log = f"Product #{i+1} (Total #{len(processed_product_hrefs_on_page) + 1})"
-                    try:
-                        if i > 0 and successful_selector_type and successful_selector_value:
-                            logger.info(f"Re-finding product containers to get product #{i+1} (using selector: {successful_selector_type}, '{successful_selector_value}')")
-                            refreshed_container_elements = self.driver.find_elements(successful_selector_type, successful_selector_value)
-                            if i < len(refreshed_container_elements):
-                                specific_container = refreshed_container_elements[i]
-                                logger.info(f"Got product #{i+1} refreshed container, trying to extract main link...")
-                                try:
-                                    main_link = self._get_main_link_from_container(specific_container)
-                                    if main_link:
-                                        current_product_element_to_click = main_link
-                                        product_description_for_log += " [from refreshed list-single extraction]"
-                                    else:
-                                        logger.warning(f"Failed to extract main link from refreshed container #{i+1}.")
-                                except StaleElementReferenceException:
-                                    logger.warning(f"Stale element when trying to operate on refreshed container #{i+1} to extract link.")
-                                except Exception as e_extract:
-                                    logger.error(f"Unknown error extracting link from refreshed container #{i+1}: {e_extract}")
-                            else: 
-                                logger.warning(f"After refreshing containers, index {i} out of range (found {len(refreshed_container_elements)} containers)")
-                        else:
-                            if i < len(product_elements):
-                                current_product_element_to_click = product_elements[i]
-                                product_description_for_log += " [from initial list]"
-                            else:
-                                logger.warning(f"Initial product list index {i} out of range (list length {len(product_elements)}) ")
-                                current_product_element_to_click = None
-
-                        if not current_product_element_to_click:
-                            logger.warning(f"Could not locate clickable element for {product_description_for_log}, skipping this product")
-                            continue 
+                # Products whose missing fields will be extracted by DeepSeek after this page
+                pending_llm = []
 
-                        target_href = current_product_element_to_click.get_attribute('href')
-                        if target_href in processed_product_hrefs_on_page:
-                            logger.info(f"Product {product_description_for_log} (URL: {target_href}) already processed on this page, skipping")
-                            continue
-
-                        logger.info(f"Clicking product {product_description_for_log} (URL: {target_href})")
-                        main_window = self.driver.current_window_handle
-                        try:
-                            current_product_element_to_click.click()
-                        except ElementClickInterceptedException:
-                            logger.warning("Regular click intercepted, trying JS click")
-                            self.driver.execute_script("arguments[0].click();", current_product_element_to_click)
-                            
-                        new_window = None
-                        if len(self.driver.window_handles) > 1:
-                            for handle in self.driver.window_handles:
-                                if handle != main_window:
-                                    new_window = handle
-                                    self.driver.switch_to.window(new_window)
-                                    logger.info("Switched to new window")
-                                    break
-                        # Scroll page before extracting product info to ensure content is fully loaded
-                        time.sleep(1)
+                if tabs > 1:
+                    # Load detail pages in batches of tabs instead of visiting them one by one
+                    products_count += self._scrape_products_in_tabs(product_hrefs[:products_to_process_on_this_page], domain, pending_llm, tabs)
+                else:
+                    # Products are visited by URL, so the listing page is loaded again only once afterwards
+                    listing_url = self.driver.current_url
+                    for i, target_href in enumerate(product_hrefs[:products_to_process_on_this_page]):
+                        product_description_for_log = f"Product #{i+1}"
                         try:
-                            # Scroll to middle of page
-                            self.driver.execute_script("window.scrollBy(0, 300);")
-                            logger.info("Small scroll on product detail page to trigger lazy-loaded content")
-                            time.sleep(1)
-                        except Exception as e:
-                            logger.warning(f"Product page scrolling failed: {e}")
-                        
-                        logger.info("Extracting product information")
-                        product_info = self.extract_product_info()
+                            logger.info(f"Opening product {product_description_for_log} (URL: {target_href})")
+                            self.driver.get(target_href)
+                            self._prepare_product_page()
                         
-                        if product_info.get('url'): 
-                           processed_product_hrefs_on_page.add(target_href) 
-                           
-                           # Use jsonlines format, append new product directly
-                           json_file_path = f"shopping_output/{domain}_products.jsonl"
-                           with open(json_file_path, "a", encoding="utf-8") as f:
-                               # If file not empty, add newline first
-                               if os.path.exists(json_file_path) and os.path.getsize(json_file_path) > 0:
-                                   f.write("\n")
-                               # Write single JSON object (one line)
-                               json.dump(product_info, f, ensure_ascii=False)
-                           
-                           products_count += 1  # Increment successful product scrape counter
-                           print(f"Appended new product to {json_file_path}: {product_info}")
-                        else:
-                            logger.warning("Extracted product info incomplete (missing URL), not saved")
-
-                        logger.info("About to handle window operations or navigate back...")
-                        if new_window:
-                            logger.info("Detected new window, preparing to close and switch...")
-                            self.driver.close()
-                            logger.info("New window closed, preparing to switch to main window...")
-                            self.driver.switch_to.window(main_window)
-                            logger.info("Switched to main window.")
-                        else:
-                            logger.info("No new window, executing driver.back()...")
-                            self.driver.back()
-                            logger.info("driver.back() executed.")
+                            logger.info("Extracting product information")
+                            product_info = self.extract_product_info(pending_llm)
                         
-                        logger.info("Preparing to execute time.sleep(3)...")
-                        time.sleep(3) 
-                        logger.info("time.sleep(3) ended. Loop about to enter next iteration or end.")
+                            if product_info.get('url'): 
+                               # Products waiting on DeepSeek are saved once the page's fallbacks have run
+                               if not (pending_llm and pending_llm[-1][0] is product_info):
+                                   self._save_product(domain, product_info)
+                                   products_count += 1  # Increment successful product scrape counter
+                            else:
+                                logger.warning("Extracted product info incomplete (missing URL), not saved")
                         
-                    except StaleElementReferenceException as e_stale:
-                        logger.error(f"StaleElementReferenceException when processing product {product_description_for_log}: {e_stale} - trying to move to next page")
-                        break 
-                    except Exception as e:
-                        logger.error(f"Error processing product {product_description_for_log}: {e}", exc_info=True)
-                        try:
-                            if new_window and self.driver.current_window_handle == new_window: 
-                                self.driver.close()
-                                self.driver.switch_to.window(main_window)
-                            elif self.driver.current_url != starting_website and "search" not in self.driver.current_url.lower():
-                                self.driver.back()
-                            time.sleep(2)
-                        except Exception as e_nav:
-                            logger.error(f"Failed to navigate back to listing page during error handling: {e_nav}")
-                            break 
+                        except Exception as e:
+                            logger.error(f"Error processing product {product_description_for_log}: {e}", exc_info=True)
+                    
+                    logger.info(f"Returning to results listing: {listing_url}")
+                    self.driver.get(listing_url)
+                    # The next page button is looked up right after, so wait for the product list to render
+                    try:
+                        WebDriverWait(self.driver, 10).until(
+                            EC.presence_of_element_located((successful_selector_type, successful_selector_value)))
+                    except TimeoutException:
+                        logger.warning(f"Product list ('{successful_selector_value}') not found after returning to the listing")
+                
+                if pending_llm:
+                    if batch:
+                        queued = queue_batch_requests([(product_info['url'], request) for product_info, (request, _, _) in pending_llm])
+                        logger.info(f"Queued {queued} DeepSeek requests in {PENDING_BATCH_FILE}")
+                        results = [{}] * len(pending_llm)
+                    else:
+                        logger.info(f"Extracting missing fields for {len(pending_llm)} products with DeepSeek API...")
+                        results = extract_fields_for_products([job for _, job in pending_llm])
+                    for (product_info, _), extracted in zip(pending_llm, results):
+                        for field, value in extracted.items():
+                            product_info[field] = value
+                            print(f"Successfully extracted {field} with DeepSeek API: {value}")
+                        self._save_product(domain, product_info)
+                        products_count += 1
                 
                 if page_num < max_pages - 1:
+                    # Taken before clicking, so the next page can wait for this list to be replaced
+                    containers = self.driver.find_elements(successful_selector_type, successful_selector_value)
+                    previous_container = containers[0] if containers else None
                     logger.info("Looking for next page button...")
                     next_button = self.find_next_page_button()
                     if next_button:
@@ -740,16 +968,141 @@ class ProductScraper:
         except Exception as e:
             logger.error(f"Top-level error during search and scrape ({starting_website}): {e}", exc_info=True)
             
+        # Make this site's results visible on disk before the next site starts
+        for fh in self._jsonl_handles.values():
+            fh.flush()
+        self._unflushed_writes = 0
         logger.info(f"Scraping on {starting_website} complete, scraped {products_count} valid products")
         return products_count  # Return scrape count
 
+    def _prepare_product_page(self, timeout=10):
+        """Wait for the current product page to load and trigger its lazy-loaded content
+        
+        Args:
+            timeout: Seconds to wait for the page to finish loading; extraction goes ahead either way
+        """
+        try:
+            WebDriverWait(self.driver, timeout).until(
+                lambda d: d.execute_script("return document.readyState") == "complete")
+        except TimeoutException:
+            logger.warning(f"Product page still loading after {timeout}s, extracting anyway")
+        try:
+            # Only pages with lazy-loaded content need the scroll and the pause after it
+            if self.driver.execute_script(SCROLL_IF_LAZY_JS, 300):
+                logger.info("Small scroll on product detail page to trigger lazy-loaded content")
+                time.sleep(0.5)
+        except Exception as e:
+            logger.warning(f"Product page scrolling failed: {e}")
+
+    def _scrape_products_in_tabs(self, hrefs, domain, pending_llm, tabs):
+        """Visit product pages in batches of browser tabs so their page loads overlap
+        
+        Args:
+            hrefs: Product page URLs to visit
+            domain: Website domain, used for the results file name
+            pending_llm: List collecting products that still need the DeepSeek fallback
+            tabs: Number of tabs to open per batch
+            
+        Returns:
+            int: Number of products saved (products waiting on DeepSeek are not counted)
+        """
+        products_count = 0
+        main_window = self.driver.current_window_handle
+        # Every batch closes the tabs it opens, so the windows open before the first batch
+        # are the only ones that are not product tabs; read them once
+        known_handles = set(self.driver.window_handles)
+        for batch_start in range(0, len(hrefs), tabs):
+            batch = hrefs[batch_start:batch_start + tabs]
+            # window.open returns immediately, so every tab in the batch loads concurrently
+            for href in batch:
+                self.driver.execute_script("window.open(arguments[0], '_blank');", href)
+            new_handles = [h for h in self.driver.window_handles if h not in known_handles]
+            # A tab that failed to close would be picked up again by the next batch
+            known_handles.update(new_handles)
+            logger.info(f"Opened {len(new_handles)} product tabs ({batch_start + 1}-{batch_start + len(batch)} of {len(hrefs)})")
+            if len(new_handles) < len(batch):
+                logger.warning(f"{len(batch) - len(new_handles)} product tabs failed to open (popup blocked?); those products are skipped")
+            
+            for handle in new_handles:
+                try:
+                    self.driver.switch_to.window(handle)
+                    # Tabs load concurrently, so give each one longer than a single page load
+                    self._prepare_product_page(timeout=20)
+                    product_info = self.extract_product_info(pending_llm)
+                    if product_info.get('url'):
+                        if not (pending_llm and pending_llm[-1][0] is product_info):
+                            self._save_product(domain, product_info)
+                            products_count += 1
+                    else:
+                        logger.warning("Extracted product info incomplete (missing URL), not saved")
+                except Exception as e:
+                    logger.error(f"Error processing product tab: {e}", exc_info=True)
+                finally:
+                    try:
+                        self.driver.close()
+                    except Exception as e:
+                        logger.warning(f"Failed to close product tab: {e}")
+            self.driver.switch_to.window(main_window)
+        return products_count
+
+    def _open_results_file(self, domain):
+        """Open the website's JSONL results file for appending, once per domain
+        
+        Returns:
+            The open file handle, also kept in self._jsonl_handles
+        """
+        fh = self._jsonl_handles.get(domain)
+        if fh is None:
+            os.makedirs("shopping_output", exist_ok=True)
+            json_file_path = f"shopping_output/{domain}_products.jsonl"
+            # Hold a shared lock while the file is open; submit_batch.py takes it
+            # exclusively before replacing the file, so no appends are lost
+            fh = self._jsonl_handles[domain] = _open_locked(
+                json_file_path, "a", fcntl and fcntl.LOCK_SH, encoding="utf-8", buffering=1 << 16)
+            # Files written by older versions lack the final newline; terminate their last record once
+            if fh.tell() > 0:
+                with open(json_file_path, "rb") as existing:
+                    existing.seek(-1, os.SEEK_END)
+                    if existing.read(1) != b"\n":
+                        fh.write("\n")
+        return fh
+
+    def _save_product(self, domain, product_info):
+        """Append a product to the website's JSONL results file
+        
+        The file is opened once per domain and kept open with a 64 KiB buffer,
+        flushed every _JSONL_FLUSH_EVERY records and when scraping or the scraper ends.
+        """
+        # Use jsonlines format, append new product directly
+        fh = self._jsonl_handles.get(domain) or self._open_results_file(domain)
+        # Write single JSON object as one newline-terminated line
+        fh.write(json.dumps(product_info, ensure_ascii=False) + "\n")
+        self._unflushed_writes += 1
+        if self._unflushed_writes >= self._JSONL_FLUSH_EVERY:
+            for handle in self._jsonl_handles.values():
+                handle.flush()
+            self._unflushed_writes = 0
+        print(f"Appended new product to {fh.name}: {product_info}")
+
+    def _wait_for_url_change(self, current_url, timeout=3):
+        """Wait up to timeout seconds for the URL to differ from current_url
+        
+        Returns:
+            bool: True if the URL changed
+        """
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.1).until(lambda d: d.current_url != current_url)
+            return True
+        except TimeoutException:
+            return False
+
     def try_next_page_button(self, button, current_url=None, tried_buttons=None):
         """Try to click next page button and verify URL change
         
         Args:
             button: Button element to click
             current_url: Current URL, if None will be auto-retrieved
-            tried_buttons: Set of already tried buttons, to avoid duplicate clicks
+            tried_buttons: Set of WebDriver element ids of already tried buttons, to avoid duplicate clicks
             
         Returns:
             (success flag, new URL) tuple, success flag True indicates URL has changed
@@ -761,21 +1114,22 @@ class ProductScraper:
             tried_buttons = set()
             
         # Skip already tried buttons
-        if button in tried_buttons:
+        # Keyed by the WebDriver element id rather than id(button): re-finding the same
+        # button returns a new WebElement object with the same element id
+        if button.id in tried_buttons:
             logger.info("Skipping already tried button")
             return False, current_url
             
-        tried_buttons.add(button)
+        tried_buttons.add(button.id)
         
         # Try to click button
         try:
             logger.info(f"Trying to click {button.tag_name} button")
             button.click()
-            time.sleep(3)  # Wait for page to load
             
-            # Check if URL has changed
-            new_url = self.driver.current_url
-            if new_url != current_url:
+            # Check if URL has changed, returning as soon as it does
+            if self._wait_for_url_change(current_url):
+                new_url = self.driver.current_url
                 logger.info(f"Success! URL has changed: {new_url}")
                 return True, new_url
             else:
@@ -786,11 +1140,10 @@ class ProductScraper:
             logger.warning("Button click intercepted, trying JS click")
             try:
                 self.driver.execute_script("arguments[0].click();", button)
-                time.sleep(3)
                 
                 # Check if URL changed after JS click
-                new_url = self.driver.current_url
-                if new_url != current_url:
+                if self._wait_for_url_change(current_url):
+                    new_url = self.driver.current_url
                     logger.info(f"JS click success! URL has changed: {new_url}")
                     return True, new_url
                 else:
@@ -803,6 +1156,34 @@ class ProductScraper:
             logger.warning(f"Error clicking button: {e}")
             return False, current_url
 
+def scrape_site(website, args):
+    """Scrape one website with its own ProductScraper; runs in a worker process when scraping in parallel
+    
+    Args:
+        website: Starting website URL
+        args: Parsed command line arguments
+        
+    Returns:
+        int: Number of products scraped
+    """
+    logger.info(f"===== Starting to process website: {website} =====")
+    scraper = ProductScraper(headless=args.headless)
+    try:
+        # search_and_scrape now returns the number of successfully scraped products
+        product_count = scraper.search_and_scrape(
+            website, 
+            search_term=args.search,
+            max_pages=args.max_pages, 
+            max_products_per_page=args.max_products,
+            scroll_speed=args.scroll_speed,
+            tabs=args.tabs,
+            batch=args.batch
+        )
+    finally:
+        del scraper
+    logger.info(f"===== Website: {website} processing complete, scraped {product_count} products =====")
+    return product_count
+
 # Execute script
 if __name__ == "__main__":
     # Parse command line arguments
@@ -813,27 +1194,20 @@ if __name__ == "__main__":
     parser.add_argument('--max-pages', type=int, default=5, help='Maximum number of pages to scrape per website (default: 5)')
     parser.add_argument('--max-products', type=int, default=100, help='Maximum number of products to scrape per page (default: 100)')
     parser.add_argument('--scroll-speed', choices=['slow', 'fast'], default='slow', help='Page scrolling speed (default: slow)')
+    parser.add_argument('--tabs', type=int, default=1, help='Number of product pages to load at once in separate tabs (default: 1)')
+    parser.add_argument('--batch', action='store_true', help='Queue DeepSeek extractions for the Batch API instead of calling it now (submit with submit_batch.py)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of websites to scrape in parallel, one browser per process (default: 1)')
     
     args = parser.parse_args()
     
-    # Initialize scraper
-    scraper = ProductScraper(headless=args.headless) 
-    try:
-        total_products = 0
-        for website in args.urls:
-            logger.info(f"===== Starting to process website: {website} =====")
-            # search_and_scrape now returns the number of successfully scraped products
-            product_count = scraper.search_and_scrape(
-                website, 
-                search_term=args.search,
-                max_pages=args.max_pages, 
-                max_products_per_page=args.max_products,
-                scroll_speed=args.scroll_speed
-            )
-            total_products += product_count
-            logger.info(f"===== Website: {website} processing complete, scraped {product_count} products =====")
-        
-        logger.info(f"All websites processed, total products scraped: {total_products}")
-            
-    finally:
-        del scraper 
\ No newline at end of file
+    workers = min(args.workers, len(args.urls), os.cpu_count() or 1)
+    if workers > 1:
+        # Parallel browsers always run headless so they don't fight over the display
+        args.headless = True
+        logger.info(f"Scraping {len(args.urls)} websites with {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            product_counts = list(executor.map(partial(scrape_site, args=args), args.urls))
+    else:
+        product_counts = [scrape_site(website, args) for website in args.urls]
+    
+    logger.info(f"All websites processed, total products scraped: {sum(product_counts)}")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import glob
+import time
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where files are not locked
+    fcntl = None
+from openai import OpenAI
+from deepseek_requests import DEEPSEEK_FIELD_DESCRIPTIONS, PENDING_BATCH_FILE, parse_deepseek_reply, missing_product_fields
+
+# Batch states after which polling stops
+_FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def load_pending_requests(batch_file):
+    """
+    Read queued requests, keeping only the newest request per custom_id
+
+    Args:
+        batch_file: JSONL file written by shopping.py --batch
+
+    Returns:
+        dict: Request lines keyed by custom_id
+    """
+    requests = {}
+    with open(batch_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Warning: Skipping invalid JSON line: {line[:50]}...")
+                continue
+            # The Batch API rejects files with duplicate custom_ids
+            requests[request['custom_id']] = request
+    return requests
+
+
+def run_batch(client, requests, model, poll_interval=60):
+    """
+    Upload requests, start a batch job and wait for it to finish
+
+    Args:
+        client: OpenAI client pointed at the provider
+        requests: Request lines keyed by custom_id
+        model: Model of the batch provider; replaces the DeepSeek model the requests were queued with
+        poll_interval: Seconds between status checks
+
+    Returns:
+        dict: Extracted fields keyed by custom_id (product URL)
+    """
+    upload_path = PENDING_BATCH_FILE + ".upload"
+    with open(upload_path, 'w', encoding='utf-8') as f:
+        for request in requests.values():
+            request = dict(request, body=dict(request['body'], model=model))
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+
+    with open(upload_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+    os.remove(upload_path)
+
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window='24h'
+    )
+    print(f"Submitted batch {batch.id} with {len(requests)} requests")
+
+    while batch.status not in _FINAL_STATES:
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        progress = f" ({counts.completed}/{counts.total} done)" if counts else ""
+        print(f"Batch {batch.id} status: {batch.status}{progress}")
+
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"Batch {batch.id} finished with status {batch.status}, no results to merge")
+        return {}
+
+    results = {}
+    fields = list(DEEPSEEK_FIELD_DESCRIPTIONS)
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get('response') or {}
+        if response.get('status_code') != 200:
+            print(f"Request {item.get('custom_id')} failed: {item.get('error') or response.get('status_code')}")
+            continue
+        choices = response.get('body', {}).get('choices') or []
+        if choices:
+            # Fields that were not asked for come back null and are dropped by the parser
+            content = choices[0].get('message', {}).get('content') or ""
+            extracted, _ = parse_deepseek_reply(content, fields)
+            results[item['custom_id']] = extracted
+    return results
+
+
+def merge_results(results, output_dir="shopping_output"):
+    """
+    Fill extracted fields into the saved products whose URL matches a custom_id
+
+    Each results file is rewritten and replaced, so a scraper appending to it
+    would lose its records. The scraper holds a shared lock on the files it has
+    open, and the merge waits for an exclusive lock before reading a file.
+    Without fcntl (Windows) nothing is locked, so do not run this during a scrape.
+
+    Args:
+        results: Extracted fields keyed by product URL
+        output_dir: Directory holding the *_products.jsonl files
+
+    Returns:
+        int: Number of product records updated
+    """
+    updated = 0
+    for json_file_path in glob.glob(os.path.join(output_dir, "*_products.jsonl")):
+        lines = []
+        changed = False
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    print(f"Waiting for the running scraper to release {json_file_path}...")
+                    fcntl.flock(f, fcntl.LOCK_EX)
+            for line in f:
+                line = line.rstrip('\n')
+                if not line.strip():
+                    continue
+                try:
+                    product_info = json.loads(line)
+                except json.JSONDecodeError:
+                    lines.append(line)
+                    continue
+                extracted = results.get(product_info.get('url')) or {}
+                # Replies may carry fields that were not asked for; only fill fields the scraper could not find
+                extracted = {field: extracted[field] for field in missing_product_fields(product_info) if field in extracted}
+                if extracted:
+                    product_info.update(extracted)
+                    line = json.dumps(product_info, ensure_ascii=False)
+                    changed = True
+                    updated += 1
+                lines.append(line)
+
+            if changed:
+                # Write to a temporary file first so an interrupted merge keeps the original;
+                # the lock on the original is held until it has been replaced
+                temp_path = json_file_path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as out:
+                    for line in lines:
+                        out.write(line + '\n')
+                os.replace(temp_path, json_file_path)
+                print(f"Updated products in {json_file_path}")
+    return updated
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Submit queued DeepSeek extractions as a batch job and merge the results")
+    parser.add_argument("--batch-file", default=PENDING_BATCH_FILE, help=f"Queued requests (default: {PENDING_BATCH_FILE})")
+    # DeepSeek has no Batch API, so the provider and its model have to be given explicitly
+    parser.add_argument("--base-url", required=True, help="API base URL of a provider with a Batch API, e.g. https://api.openai.com/v1")
+    parser.add_argument("--model", required=True, help="Model to run the queued requests with, e.g. gpt-4o-mini")
+    parser.add_argument("--api-key-env", default="DEEPSEEK_API_KEY", help="Environment variable holding the API key (default: DEEPSEEK_API_KEY)")
+    parser.add_argument("--poll-interval", type=int, default=60, help="Seconds between batch status checks (default: 60)")
+
+    args = parser.parse_args()
+
+    # Submit from a snapshot, so scrapers running meanwhile queue new requests
+    # in a fresh file instead of one that is rewritten when the batch ends
+    snapshot_file = args.batch_file + ".submitting"
+    if os.path.exists(snapshot_file):
+        print(f"Resubmitting requests left in {snapshot_file} by an interrupted run")
+    elif os.path.exists(args.batch_file):
+        with open(args.batch_file, 'rb') as f:
+            if fcntl is not None:
+                # Scrapers hold this lock while appending, so no request is cut off
+                fcntl.flock(f, fcntl.LOCK_EX)
+            os.replace(args.batch_file, snapshot_file)
+    else:
+        print(f"No queued requests found at {args.batch_file}")
+        sys.exit(1)
+
+    requests = load_pending_requests(snapshot_file)
+    if not requests:
+        print("No queued requests to submit")
+        os.remove(snapshot_file)
+        return
+
+    client = OpenAI(base_url=args.base_url, api_key=os.getenv(args.api_key_env))
+    results = run_batch(client, requests, args.model, args.poll_interval)
+    updated = merge_results(results)
+    print(f"Merged results for {len(results)} requests into {updated} product records")
+
+    # Queue requests without a result again so they can be resubmitted, appending
+    # after anything scrapers queued while the batch was running
+    remaining = [request for custom_id, request in requests.items() if custom_id not in results]
+    if remaining:
+        with open(args.batch_file, 'ab', buffering=0) as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(''.join(json.dumps(request, ensure_ascii=False) + '\n' for request in remaining).encode('utf-8'))
+        print(f"{len(remaining)} requests left in {args.batch_file}")
+    os.remove(snapshot_file)
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,14 @@ import os
 import time
 import json
 import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
-from collections import Counter
 from openai import OpenAI
 from collections import defaultdict
 import argparse
 import re
+import hashlib
+from urllib.parse import urlparse
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 
 
 client = OpenAI(
@@ -16,6 +17,9 @@ client = OpenAI(
     api_key=os.getenv("DEEPSEEK_API_KEY")
 )
 
+# Extraction rules inferred by the LLM, one file per domain and card class combo
+RULES_CACHE_DIR = "rules_cache"
+
 
 parser = argparse.ArgumentParser(
     description="Profile scraper: specify URL to scrape and output file to write results."
@@ -26,50 +30,85 @@ parser.add_argument(
 )
 parser.add_argument(
     "--output", default="output.json",
-    help="Path to output JSON file"
+    help="Path to output JSON file (a .jsonl path writes one JSON object per line)"
+)
+parser.add_argument(
+    "--refresh-rules", action="store_true",
+    help="Ask the LLM for new extraction rules instead of using the cached ones"
 )
 args = parser.parse_args()
 
 
+# Buttons or links whose text contains "load" (case-insensitive), built once at import
+_LOAD_XPATH = (
+    "//button"
+    "[contains("
+      "translate(normalize-space(.),"
+                "'ABCDEFGHIJKLMNOPQRSTUVWXYZ',"
+                "'abcdefghijklmnopqrstuvwxyz'),"
+      "'load'"
+    ")]"
+    "|"
+    "//a"
+    "[contains("
+      "translate(normalize-space(.),"
+                "'ABCDEFGHIJKLMNOPQRSTUVWXYZ',"
+                "'abcdefghijklmnopqrstuvwxyz'),"
+      "'load'"
+    ")]"
+)
+
+# Number of elements in the document, used to notice content added by JS/AJAX
+_DOM_SIZE_JS = "return document.getElementsByTagName('*').length;"
+
+def wait_for_page_ready(driver, timeout=15, settle=1.0):
+    """
+    Wait until the document has loaded and its element count has stopped
+    changing for settle seconds, giving up after timeout seconds.
+    """
+    deadline = time.time() + timeout
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete")
+    except TimeoutException:
+        return
+    last_size = -1
+    while time.time() < deadline:
+        size = driver.execute_script(_DOM_SIZE_JS)
+        if size == last_size:
+            return
+        last_size = size
+        time.sleep(settle)
+
+# First visible, enabled element matching the XPath in arguments[0], or null
+_FIRST_CLICKABLE_JS = """
+const found = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (let i = 0; i < found.snapshotLength; i++) {
+    const e = found.snapshotItem(i);
+    const r = e.getBoundingClientRect();
+    const s = getComputedStyle(e);
+    if (r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none' && !e.disabled) {
+        return e;
+    }
+}
+return null;
+"""
 
 def click_load_more(driver, max_clicks=10, pause=1):
     """
     Click any "load" buttons or links up to max_clicks times, pausing after each.
     """
     for i in range(1, max_clicks+1):
-        xpath = (
-            "//button"
-            "[contains("
-              "translate(normalize-space(.),"
-                        "'ABCDEFGHIJKLMNOPQRSTUVWXYZ',"
-                        "'abcdefghijklmnopqrstuvwxyz'),"
-              "'load'"
-            ")]"
-            "|"
-            "//a"
-            "[contains("
-              "translate(normalize-space(.),"
-                        "'ABCDEFGHIJKLMNOPQRSTUVWXYZ',"
-                        "'abcdefghijklmnopqrstuvwxyz'),"
-              "'load'"
-            ")]"
-        )
-        elems = driver.find_elements(By.XPATH, xpath)
-        if not elems:
-            # print(f"[DEBUG] no more load controls after {i-1} clicks")
-            break
-
-        btn = None
-        for e in elems:
-            if e.is_displayed() and e.is_enabled():
-                btn = e
-                break
-        if not btn:
-            print("[DEBUG] found load controls but none clickable, stopping")
+        # Visibility and enabled checks run in the browser, polled until a control is clickable
+        try:
+            btn = WebDriverWait(driver, pause).until(
+                lambda d: d.execute_script(_FIRST_CLICKABLE_JS, _LOAD_XPATH))
+        except TimeoutException:
+            # print(f"[DEBUG] no clickable load controls after {i-1} clicks")
             break
 
-        text = btn.text.strip().replace("\n", " ")
-        # print(f"[DEBUG] clicking load control #{i}: <{btn.tag_name}> '{text[:30]}…'")
+        # print(f"[DEBUG] clicking load control #{i}: <{btn.tag_name}>")
+        before = driver.execute_script(_DOM_SIZE_JS)
         try:
             btn.click()
         except Exception as ex:
@@ -77,62 +116,88 @@ def click_load_more(driver, max_clicks=10, pause=1):
             time.sleep(0.5)
             btn.click()
 
-        time.sleep(pause)
+        # Continue as soon as new entries show up rather than after a fixed pause
+        try:
+            WebDriverWait(driver, pause * 3).until(
+                lambda d: d.execute_script(_DOM_SIZE_JS) > before)
+        except TimeoutException:
+            pass
 
 KEYWORDS = ["professor", "lecturer"]
 
+# Class combos (whole class attributes) seen at least arguments[0] times; of the
+# arguments[1] most frequent, return the one whose elements most often mention
+# a keyword from arguments[2], or null
+_FREQUENT_COMBO_JS = """
+const [minFreq, topN, keywords] = arguments;
+const counts = new Map();
+const elems = document.querySelectorAll('*[class]');
+for (const e of elems) {
+    const cls = (e.getAttribute('class') || '').trim();
+    if (cls) counts.set(cls, (counts.get(cls) || 0) + 1);
+}
+const top = [...counts].filter(([, n]) => n >= minFreq)
+    .sort((a, b) => b[1] - a[1]).slice(0, topN);
+if (!top.length) return null;
+const hits = new Map(top.map(([cls]) => [cls, 0]));
+for (const e of elems) {
+    const cls = (e.getAttribute('class') || '').trim();
+    if (!hits.has(cls)) continue;
+    const text = (e.innerText || '').toLowerCase();
+    if (keywords.some(kw => text.includes(kw))) hits.set(cls, hits.get(cls) + 1);
+}
+let best = null, bestRatio = -1;
+for (const [cls, n] of top) {
+    const ratio = hits.get(cls) / n;
+    if (ratio > bestRatio) { best = cls; bestRatio = ratio; }
+}
+return best;
+"""
+
 def inspect_frequent_combos(driver, min_freq=5, top_n=10) -> list[str]:
     """
     Find the CSS class combo most enriched for professor/lecturer entries.
     """
-    # 1) Find all elements with a class attribute
-    elems = driver.find_elements(By.CSS_SELECTOR, "*[class]")
-    combos = []
-    for e in elems:
-        cls = (e.get_attribute("class") or "").strip()
-        if cls:
-            combos.append(cls)
-    cnt = Counter(combos)
-
-    # 2) Sort by frequency and truncate
-    freq_list = [
-        (combo, freq) 
-        for combo, freq in cnt.most_common() 
-        
-        if freq >= min_freq
-    ][:top_n]
-    # for combo, freq in freq_list:
-    #     print(f"  » '{combo}'  freq={freq}")
-
-    scored = []
-    for combo, freq in freq_list:
-        xpath = f"//*[@class={repr(combo)}]"
-        nodes = driver.find_elements(By.XPATH, xpath)
-
-        total = len(nodes)
-        hit   = sum(1 for n in nodes
-                    if any(kw in (n.text or "").lower() for kw in KEYWORDS))
-        ratio = hit / total if total else 0
-        # print(f"[DEBUG] combo='{combo}' | hits={hit}/{total} | ratio={ratio:.2f}")
-        scored.append((combo, ratio))
-
-    if not scored:
+    # Counting and keyword scoring run in the browser with one round-trip,
+    # instead of one get_attribute/text call per element
+    best_combo = driver.execute_script(_FREQUENT_COMBO_JS, min_freq, top_n, KEYWORDS)
+    if not best_combo:
         print("[DEBUG] no combos scored → returning []")
         return []
 
-    best_combo, best_ratio = max(scored, key=lambda x: x[1])
-    # print(f"\n[DEBUG] best combo by 'professor|lecturer' ratio: '{best_combo}' (ratio={best_ratio:.2f})")
+    # print(f"\n[DEBUG] best combo by 'professor|lecturer' ratio: '{best_combo}'")
     return [best_combo]
 
 
+# For every card matching arguments[0], read each field's selector from arguments[1]
+# (field -> CSS selector): the element's visible text, else its parent's data-value,
+# else "" when the selector matches nothing or is invalid
+_EXTRACT_CARDS_JS = """
+const [cardSelector, selectors] = arguments;
+return Array.from(document.querySelectorAll(cardSelector)).map(card => {
+    const item = {};
+    for (const [field, selector] of Object.entries(selectors)) {
+        let el = null;
+        try {
+            el = selector ? card.querySelector(selector) : null;
+        } catch (e) {}
+        if (!el) {
+            item[field] = '';
+            continue;
+        }
+        const text = (el.innerText || '').trim();
+        item[field] = text || (el.parentElement && el.parentElement.getAttribute('data-value')) || '';
+    }
+    return item;
+});
+"""
+
+# JSON object inside a ```json ... ``` fence in the LLM reply
+_FENCED_JSON_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
 
 def parse_rules_json(rules_json: str) -> dict:
     """Extract JSON object from LLM response."""
-    m = re.search(
-        r"```(?:json)?\s*(\{.*?\})\s*```",
-        rules_json,
-        flags=re.DOTALL
-    )
+    m = _FENCED_JSON_RE.search(rules_json)
     if m:
         json_str = m.group(1)
     else:
@@ -148,19 +213,14 @@ def parse_rules_json(rules_json: str) -> dict:
         raise ValueError(f"Failed to parse JSON: {e}\nJSON was:\n{json_str}")
 
 
-def scrape_faculty(url, output_path):
-    driver = uc.Chrome(version_main=135)
-
-    driver.get(url)
-    time.sleep(15)  # wait for JS/AJAX to load
-    click_load_more(driver, max_clicks=12, pause=3)
-    common = inspect_frequent_combos(driver, min_freq=50, top_n=5)
-    nodes = driver.find_elements(By.CSS_SELECTOR, f"[class='{common[0]}']")
-    # Sample card to infer rules
-    sample_html = nodes[1].get_attribute("innerHTML")
+def infer_rules(driver, combo, card_selector):
+    """Ask the LLM for per-field CSS selectors, using one profile card as the sample."""
+    # Sample card to infer rules; only its HTML crosses the wire instead of a reference to every card
+    sample_html = driver.execute_script(
+        "return document.querySelectorAll(arguments[0])[1].innerHTML;", card_selector)
     # print(f"[DEBUG] sample HTML: {sample_html}")
     prompt = f"""
-    Here is an HTML snippet for a single profile card (inside a <div class="{common[0]}">):
+    Here is an HTML snippet for a single profile card (inside a <div class="{combo}">):
     {sample_html}
     Please analyze this and produce a JSON object with exactly these seven keys: "name", "title", "email", "research interest".  
     For each key, provide:
@@ -187,47 +247,70 @@ def scrape_faculty(url, output_path):
         for field, info in rules.items()
         if info.get("selector", "").strip()  
     }
-    # print(f"[DEBUG] extracted rules: {json.dumps(rules, indent=2, ensure_ascii=False)}")
-    cards = driver.find_elements(By.CSS_SELECTOR, f"[class='{common[0]}']")
-
-    extracted = []
-    for card in cards:
-        item = {}
-        html = card.get_attribute("innerHTML")
-
-        for field, rule in rules.items():
-            sel = rule.get("selector","").strip()
-            if sel:
-                try:
-                    el = card.find_element(By.CSS_SELECTOR, sel)
-                    item[field] = el.text.strip()
-                    if not el.text.strip():
-                        parent = el.find_element(By.XPATH, "..")
-                        val = parent.get_attribute("data-value") or ""
-                        item[field] = val
-                    continue
-                except Exception:
-                    # print(f"[DEBUG] selector '{sel}' failed to find element in card")
-                    pass
-
-
-            item[field] = ""
-        extracted.append(item)
-    unique = []
+    return rules
+
+
+def load_rules(driver, url, combo, card_selector, refresh=False):
+    """
+    Return extraction rules for the cards, reusing the rules cached for this
+    domain and class combo unless refresh is set.
+    """
+    key = hashlib.sha1(combo.encode() + urlparse(url).netloc.encode()).hexdigest()
+    cache_path = os.path.join(RULES_CACHE_DIR, f"{key}.json")
+    if not refresh and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            # print(f"[DEBUG] using cached rules from {cache_path}")
+            return json.load(f)
+
+    rules = infer_rules(driver, combo, card_selector)
+    # Don't pin an empty answer; the next run asks again
+    if rules:
+        os.makedirs(RULES_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(rules, f, indent=2, ensure_ascii=False)
+    return rules
+
+
+def _unique_items(extracted):
+    """Yield each extracted item once, in the order first seen."""
     seen = set()
     for item in extracted:
-        # use sorted items tuple as hashable key
-        key = tuple(sorted(item.items()))
+        # one C-level serialization gives a cheap hashable key
+        key = json.dumps(item, sort_keys=True, ensure_ascii=False)
         if key not in seen:
             seen.add(key)
-            unique.append(item)
-    extracted = unique
+            yield item
+
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(extracted, f, indent=2, ensure_ascii=False)
+def scrape_faculty(url, output_path, refresh_rules=False):
+    driver = uc.Chrome(version_main=135)
+
+    driver.get(url)
+    wait_for_page_ready(driver, timeout=15)  # wait for JS/AJAX to load
+    click_load_more(driver, max_clicks=12, pause=3)
+    common = inspect_frequent_combos(driver, min_freq=50, top_n=5)
+    card_selector = f"[class='{common[0]}']"
+    rules = load_rules(driver, url, common[0], card_selector, refresh=refresh_rules)
+    # print(f"[DEBUG] extracted rules: {json.dumps(rules, indent=2, ensure_ascii=False)}")
+
+    # All cards are read in one script call instead of find_element/.text per card and field
+    extracted = driver.execute_script(
+        _EXTRACT_CARDS_JS,
+        card_selector,
+        {field: rule.get("selector", "").strip() for field, rule in rules.items()}
+    )
+    if output_path.endswith(".jsonl"):
+        # JSON Lines: unique items are streamed straight to the file, with no deduplicated copy of the list
+        with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            for item in _unique_items(extracted):
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
         print(f"Saved extraction to {output_path}")
+    else:
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(list(_unique_items(extracted)), f, indent=2, ensure_ascii=False)
+            print(f"Saved extraction to {output_path}")
     driver.quit()
         
 
 if __name__ == "__main__":
-    data = scrape_faculty(args.url, args.output)
+    data = scrape_faculty(args.url, args.output, refresh_rules=args.refresh_rules)